@@ -0,0 +1,164 @@
+"""
+Benchmark de la difusión de notificaciones en tiempo real (realtime_backends)
+Mide la latencia desde publish() hasta que cada suscriptor recibe el mensaje, con miles de suscriptores
+- inprocess: un proceso con todos los suscriptores
+- sqlite: suscriptores repartidos en varios procesos (como varios workers de uvicorn) y el publicador en otro
+
+Uso: python benchmark_realtime.py --subscribers 1000 5000 --messages 200 --processes 4 [--batch-window-ms 150]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from realtime import Broadcaster
+from realtime_backends import InProcessBackend, SqliteOutboxBackend
+
+CHANNEL = "bench"
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def consume(broadcaster: Broadcaster, subscribers: int, messages: int, ready=None, timeout: float = 60):
+    """Suscribir y esperar todos los mensajes. Retorna las latencias (segundos) de cada entrega"""
+    latencies = []
+
+    async def subscriber(subscription):
+        received = 0
+        while received < messages:
+            batch = await subscription.get()
+            if batch is None:
+                raise RuntimeError("Subscriber queue overflowed")
+            # Lo que mide el benchmark incluye serializar el lote, como al enviarlo por el WebSocket
+            batch.text
+            now = time.time()
+            for message in batch.messages:
+                latencies.append(now - message["sent_at"])
+            received += len(batch.messages)
+
+    contexts = [broadcaster.subscribe(CHANNEL) for _ in range(subscribers)]
+    subscriptions = [context.__enter__() for context in contexts]
+    tasks = [asyncio.create_task(subscriber(subscription)) for subscription in subscriptions]
+    if ready is not None:
+        ready()
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+    finally:
+        for context in contexts:
+            context.__exit__(None, None, None)
+    return latencies
+
+
+async def publish(broadcaster: Broadcaster, messages: int, interval: float):
+    for number in range(messages):
+        broadcaster.publish(CHANNEL, {"n": number, "sent_at": time.time(), "payload": "x" * 200})
+        await asyncio.sleep(interval)
+
+
+async def run_inprocess(subscribers: int, messages: int, interval: float, batch_window: float) -> list:
+    broadcaster = Broadcaster(messages + 1, InProcessBackend(), batch_window)
+    ready = asyncio.Event()
+    consumer = asyncio.create_task(consume(broadcaster, subscribers, messages, ready.set))
+    await ready.wait()
+    await publish(broadcaster, messages, interval)
+    return await consumer
+
+
+def _sqlite_worker(path, poll_interval, batch_window, subscribers, messages, ready, results):
+    async def main():
+        broadcaster = Broadcaster(messages + 1, SqliteOutboxBackend(path, poll_interval=poll_interval), batch_window)
+        broadcaster.backend.start(asyncio.get_running_loop())
+        try:
+            return await consume(broadcaster, subscribers, messages, ready.set)
+        finally:
+            broadcaster.backend.stop()
+
+    results.put(asyncio.run(main()))
+
+
+def run_sqlite(
+    subscribers: int, messages: int, interval: float, processes: int, poll_interval: float, batch_window: float
+) -> list:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "outbox.db")
+        SqliteOutboxBackend(path)  # crear las tablas antes de arrancar los procesos
+
+        results = context.Queue()
+        workers, events = [], []
+        for index in range(processes):
+            share = subscribers // processes + (1 if index < subscribers % processes else 0)
+            ready = context.Event()
+            worker = context.Process(
+                target=_sqlite_worker, args=(path, poll_interval, batch_window, share, messages, ready, results)
+            )
+            worker.start()
+            workers.append(worker)
+            events.append(ready)
+        for ready in events:
+            ready.wait(60)
+
+        async def publisher():
+            broadcaster = Broadcaster(messages + 1, SqliteOutboxBackend(path, poll_interval=poll_interval))
+            broadcaster.backend.start(asyncio.get_running_loop())
+            try:
+                await publish(broadcaster, messages, interval)
+            finally:
+                broadcaster.backend.stop()
+
+        asyncio.run(publisher())
+        latencies = []
+        for _ in workers:
+            latencies.extend(results.get(timeout=120))
+        for worker in workers:
+            worker.join()
+    return latencies
+
+
+def report(name: str, subscribers: int, processes: int, messages: int, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    print(
+        f"{name:<10} subs={subscribers:<6} procs={processes:<3} msgs={messages:<5} "
+        f"deliveries={len(latencies):<8} "
+        f"p50={percentile(latencies, 0.50) * 1000:7.2f} ms  "
+        f"p99={percentile(latencies, 0.99) * 1000:7.2f} ms  "
+        f"max={latencies[-1] * 1000 if latencies else float('nan'):7.2f} ms  "
+        f"total={elapsed:6.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de difusión en tiempo real")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=10, help="pausa entre mensajes publicados")
+    parser.add_argument("--processes", type=int, default=4, help="procesos suscriptores para sqlite")
+    parser.add_argument("--poll-interval-ms", type=float, default=10)
+    parser.add_argument("--batch-window-ms", type=float, default=0, help="ventana para agrupar mensajes por canal")
+    parser.add_argument("--backends", nargs="+", default=["inprocess", "sqlite"], choices=["inprocess", "sqlite"])
+    args = parser.parse_args()
+    interval = args.interval_ms / 1000
+    batch_window = args.batch_window_ms / 1000
+
+    for subscribers in args.subscribers:
+        if "inprocess" in args.backends:
+            start = time.perf_counter()
+            latencies = asyncio.run(run_inprocess(subscribers, args.messages, interval, batch_window))
+            report("inprocess", subscribers, 1, args.messages, latencies, time.perf_counter() - start)
+        if "sqlite" in args.backends:
+            start = time.perf_counter()
+            latencies = run_sqlite(
+                subscribers, args.messages, interval, args.processes, args.poll_interval_ms / 1000, batch_window
+            )
+            report("sqlite", subscribers, args.processes, args.messages, latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
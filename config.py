@@ -14,7 +14,52 @@ class Config:
     API_HOST: str = os.getenv("API_HOST", "localhost")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     API_PROTOCOL: str = os.getenv("API_PROTOCOL", "http")
-    
+
+    # Database Configuration
+    DATABASE_PATH: str = os.getenv("DATABASE_PATH", "app.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+    DB_MMAP_SIZE_MB: int = int(os.getenv("DB_MMAP_SIZE_MB", "256"))
+    DB_MAX_CONCURRENCY: int = int(os.getenv("DB_MAX_CONCURRENCY", "32"))
+    IMAGE_MIGRATION_CHUNK_SIZE: int = int(os.getenv("IMAGE_MIGRATION_CHUNK_SIZE", "200"))
+
+    # Image Storage Configuration
+    IMAGE_STORAGE_BACKEND: str = os.getenv("IMAGE_STORAGE_BACKEND", "filesystem")
+    IMAGE_STORAGE_DIR: str = os.getenv("IMAGE_STORAGE_DIR", "image_store")
+    IMAGE_BATCH_MAX_ITEMS: int = int(os.getenv("IMAGE_BATCH_MAX_ITEMS", "50"))
+    IMAGE_MAX_UPLOAD_BYTES: int = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    IMAGE_CACHE_MAX_ITEM_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_ITEM_BYTES", str(8 * 1024 * 1024)))
+    IMAGE_PACK_DIR: str = os.getenv("IMAGE_PACK_DIR", "image_packs")
+    IMAGE_PACK_MAX_BYTES: int = int(os.getenv("IMAGE_PACK_MAX_BYTES", str(1024 * 1024 * 1024)))
+    IMAGE_COMPACT_AFTER_DAYS: float = float(os.getenv("IMAGE_COMPACT_AFTER_DAYS", "30"))
+
+    # Image Worker Pool Configuration
+    IMAGE_WORKER_MODE: str = os.getenv("IMAGE_WORKER_MODE", "thread")
+    IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 2)))
+    IMAGE_WORKER_QUEUE: int = int(os.getenv("IMAGE_WORKER_QUEUE", "32"))
+    IMAGE_WORKER_RETRY_AFTER: int = int(os.getenv("IMAGE_WORKER_RETRY_AFTER", "1"))
+
+    # Image Variants Configuration
+    IMAGE_VARIANT_CACHE_DIR: str = os.getenv("IMAGE_VARIANT_CACHE_DIR", "image_variants")
+    IMAGE_VARIANT_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_VARIANT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    IMAGE_VARIANT_MAX_DIMENSION: int = int(os.getenv("IMAGE_VARIANT_MAX_DIMENSION", "2048"))
+    IMAGE_VARIANT_QUALITY: int = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+    IMAGE_THUMB_WIDTH: int = int(os.getenv("IMAGE_THUMB_WIDTH", "400"))
+    IMAGE_FEED_PAGE_SIZE: int = int(os.getenv("IMAGE_FEED_PAGE_SIZE", "12"))
+
+    # Realtime Configuration
+    REALTIME_BACKEND: str = os.getenv("REALTIME_BACKEND", "inprocess")
+    REALTIME_OUTBOX_PATH: str = os.getenv("REALTIME_OUTBOX_PATH", "realtime.db")
+    REALTIME_POLL_INTERVAL_MS: float = float(os.getenv("REALTIME_POLL_INTERVAL_MS", "10"))
+    REALTIME_OUTBOX_QUEUE_SIZE: int = int(os.getenv("REALTIME_OUTBOX_QUEUE_SIZE", "10000"))
+    REALTIME_QUEUE_SIZE: int = int(os.getenv("REALTIME_QUEUE_SIZE", "256"))
+    REALTIME_BATCH_WINDOW_MS: float = float(os.getenv("REALTIME_BATCH_WINDOW_MS", "150"))
+    LEADERBOARD_LIVE_TOP_N: int = int(os.getenv("LEADERBOARD_LIVE_TOP_N", "100"))
+    REALTIME_REPLAY_BUFFER: int = int(os.getenv("REALTIME_REPLAY_BUFFER", "1000"))
+    SSE_KEEPALIVE_SECONDS: float = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
     @classmethod
     def get_api_base_url(cls, request: Optional[object] = None) -> str:
         """
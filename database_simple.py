@@ -1,124 +1,677 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import base64
+import binascii
 import os
 
-DATABASE_PATH = "app.db"
+from config import config
+from db_pool import ConnectionPool
+from image_cache import ImageByteCache
+from image_packs import PackStore
+from image_storage import create_image_storage
+from image_utils import compute_digest, detect_mime_type
+
+DATABASE_PATH = config.DATABASE_PATH
+
+# Tablas que se pueden limpiar individualmente
+TABLES = ("images", "users", "leaderboard")
+
+# Metadatos opcionales que se guardan junto con cada imagen (insert_image(..., metadata={...}))
+IMAGE_METADATA_COLUMNS = ("style", "user_id", "timestamp", "width", "height")
+
+_pool = ConnectionPool(
+    DATABASE_PATH,
+    max_readers=config.DB_POOL_SIZE,
+    busy_timeout_ms=config.DB_BUSY_TIMEOUT_MS,
+    cache_size_kb=config.DB_CACHE_SIZE_KB,
+    mmap_size_mb=config.DB_MMAP_SIZE_MB,
+)
+
+# Dónde se guardan los bytes de las imágenes (en la tabla images o en disco por SHA-256)
+image_storage = create_image_storage(
+    config.IMAGE_STORAGE_BACKEND, config.IMAGE_STORAGE_DIR
+)
+
+# Packs de solo-agregar con los bytes de las imágenes antiguas (ver compact_images)
+image_packs = PackStore(config.IMAGE_PACK_DIR, config.IMAGE_PACK_MAX_BYTES)
+
+# Bytes de las imágenes más pedidas, por sha256 (se vacía al borrar imágenes)
+image_cache = ImageByteCache(config.IMAGE_CACHE_MAX_BYTES, config.IMAGE_CACHE_MAX_ITEM_BYTES)
+
+
+def read_connection():
+    """Obtener una conexión de lectura del pool (usar con `with`)"""
+    return _pool.reader()
+
+
+def write_connection():
+    """Obtener la conexión de escritura del pool (usar con `with`, hace commit al salir)"""
+    return _pool.writer()
 
 
 def init_database():
     """Inicializar la base de datos y crear las tablas"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
+
+        # Todo el esquema en una sola transacción (los contadores se inicializan junto con sus triggers)
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Crear tabla de imágenes
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_data BLOB NOT NULL,
+                mime_type TEXT,
+                size_bytes INTEGER,
+                sha256 TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                style TEXT,
+                user_id TEXT,
+                timestamp TEXT,
+                width INTEGER,
+                height INTEGER
+            )
+        """
+        )
 
-    # Crear tabla de imágenes
-    cursor.execute(
+        # Bases de datos antiguas: agregar las columnas nuevas de imágenes
+        _add_missing_columns(
+            cursor,
+            "images",
+            {
+                "mime_type": "TEXT",
+                "size_bytes": "INTEGER",
+                "sha256": "TEXT",
+                "style": "TEXT",
+                "user_id": "TEXT",
+                "timestamp": "TEXT",
+                "width": "INTEGER",
+                "height": "INTEGER",
+            },
+        )
+
+        # Crear tabla de contenidos guardados fuera de la base de datos (uno por SHA-256)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_blobs (
+                sha256 TEXT PRIMARY KEY,
+                size_bytes INTEGER NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+
+        # Crear tabla con la ubicación de los contenidos compactados en packs (uno por SHA-256)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_pack_entries (
+                sha256 TEXT PRIMARY KEY,
+                pack_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                packed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
         """
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            image_data TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
+
+        # Crear tabla de usuarios
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                email TEXT NOT NULL,
+                time TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+
+        # Crear tabla de leaderboard
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leaderboard (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+
+        _create_indexes(cursor)
+        _create_counters(cursor)
+
+
+def _create_counters(cursor):
+    """
+    Crear la tabla table_stats con los totales por tabla, por juego en el leaderboard ("leaderboard_game")
+    y por usuario y por estilo en las imágenes ("images_user" / "images_style")
+    Los triggers la mantienen al día en cada INSERT/DELETE, así los listados leen el total
+    con una búsqueda por clave en lugar de un COUNT(*) sobre toda la tabla
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_stats (
+            table_name TEXT NOT NULL,
+            group_key TEXT NOT NULL DEFAULT '',
+            row_count INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, group_key)
+        ) WITHOUT ROWID
     """
     )
 
-    # Crear tabla de usuarios
-    cursor.execute(
+    def bump(table_name, group_key, sign, size_column=None):
+        size = f"{sign}{size_column}" if size_column else "0"
+        # Las filas sin grupo (user_id o style NULL) no se cuentan por grupo
+        return f"""
+            INSERT INTO table_stats (table_name, group_key, row_count, total_bytes)
+            SELECT '{table_name}', {group_key}, {sign}1, {size} WHERE {group_key} IS NOT NULL
+            ON CONFLICT (table_name, group_key) DO UPDATE SET
+                row_count = row_count + excluded.row_count,
+                total_bytes = total_bytes + excluded.total_bytes;
         """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            email TEXT NOT NULL,
-            time TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+
+    triggers = {
+        "trg_images_stats_insert": (
+            "AFTER INSERT ON images",
+            bump("images", "''", "+") + bump("images_user", "NEW.user_id", "+")
+            + bump("images_style", "NEW.style", "+"),
+        ),
+        "trg_images_stats_delete": (
+            "AFTER DELETE ON images",
+            bump("images", "''", "-") + bump("images_user", "OLD.user_id", "-")
+            + bump("images_style", "OLD.style", "-"),
+        ),
+        "trg_images_stats_update": (
+            "AFTER UPDATE OF user_id, style ON images",
+            bump("images_user", "OLD.user_id", "-") + bump("images_user", "NEW.user_id", "+")
+            + bump("images_style", "OLD.style", "-") + bump("images_style", "NEW.style", "+"),
+        ),
+        "trg_users_count_insert": ("AFTER INSERT ON users", bump("users", "''", "+")),
+        "trg_users_count_delete": ("AFTER DELETE ON users", bump("users", "''", "-")),
+        "trg_leaderboard_stats_insert": (
+            "AFTER INSERT ON leaderboard",
+            bump("leaderboard", "''", "+") + bump("leaderboard_game", "NEW.game", "+"),
+        ),
+        "trg_leaderboard_stats_delete": (
+            "AFTER DELETE ON leaderboard",
+            bump("leaderboard", "''", "-") + bump("leaderboard_game", "OLD.game", "-"),
+        ),
+        "trg_leaderboard_stats_update": (
+            "AFTER UPDATE OF game ON leaderboard",
+            bump("leaderboard_game", "OLD.game", "-") + bump("leaderboard_game", "NEW.game", "+"),
+        ),
+        "trg_image_blobs_count_insert": (
+            "AFTER INSERT ON image_blobs",
+            bump("image_blobs", "''", "+", "NEW.size_bytes"),
+        ),
+        "trg_image_blobs_count_delete": (
+            "AFTER DELETE ON image_blobs",
+            bump("image_blobs", "''", "-", "OLD.size_bytes"),
+        ),
+        "trg_image_pack_entries_count_insert": (
+            "AFTER INSERT ON image_pack_entries",
+            bump("image_pack_entries", "''", "+", "NEW.size_bytes"),
+        ),
+        "trg_image_pack_entries_count_delete": (
+            "AFTER DELETE ON image_pack_entries",
+            bump("image_pack_entries", "''", "-", "OLD.size_bytes"),
+        ),
+    }
+    # Los de versiones anteriores no contaban por usuario ni por estilo, y guardaban el total por juego
+    # con table_name 'leaderboard' (un juego "" pisaba el total general)
+    for old_trigger in (
+        "trg_images_count_insert", "trg_images_count_delete",
+        "trg_leaderboard_count_insert", "trg_leaderboard_count_delete", "trg_leaderboard_count_update",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {old_trigger}")
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name, (event, body) in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+    # Primera vez, tabla recién creada o triggers nuevos: calcular los totales actuales
+    if set(triggers) - existing:
+        _rebuild_counters(cursor)
+
+
+def _rebuild_counters(cursor):
+    """Recalcular table_stats desde cero con COUNT(*)"""
+    cursor.execute("DELETE FROM table_stats")
+    for table in TABLES:
+        cursor.execute(
+            f"INSERT INTO table_stats (table_name, group_key, row_count) SELECT '{table}', '', COUNT(*) FROM {table}"
         )
+    for counter, table, column in (
+        ("leaderboard_game", "leaderboard", "game"),
+        ("images_user", "images", "user_id"),
+        ("images_style", "images", "style"),
+    ):
+        cursor.execute(
+            f"INSERT INTO table_stats (table_name, group_key, row_count) SELECT '{counter}', {column}, COUNT(*) "
+            f"FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}"
+        )
+    for table in ("image_blobs", "image_pack_entries"):
+        cursor.execute(
+            f"INSERT INTO table_stats (table_name, group_key, row_count, total_bytes) SELECT '{table}', '', COUNT(*), COALESCE(SUM(size_bytes), 0) FROM {table}"
+        )
+
+
+def _get_counter(cursor, table_name: str, group_key: str = ""):
+    """Leer un total mantenido por los triggers. Retorna (filas, bytes)"""
+    cursor.execute(
+        "SELECT row_count, total_bytes FROM table_stats WHERE table_name = ? AND group_key = ?",
+        (table_name, group_key),
+    )
+    result = cursor.fetchone()
+    return result if result else (0, 0)
+
+
+def _create_indexes(cursor):
+    """
+    Crear (si no existen) los índices que usan las consultas de listado
+    Cada uno coincide con el ORDER BY (y el filtro) de su consulta, así SQLite recorre el índice
+    en orden en lugar de escanear la tabla y ordenar en un B-tree temporal
     """
+    # Índices anchos (cubrían todas las columnas del listado) de versiones anteriores: cada INSERT
+    # los mantenía completos; con las claves alcanza para recorrer en orden sin B-tree temporal
+    for old_index in ("idx_images_listing", "idx_images_recent", "idx_images_user", "idx_images_style"):
+        cursor.execute(f"DROP INDEX IF EXISTS {old_index}")
+
+    # /images/ y /users/: ORDER BY created_at DESC, id DESC (y keyset sobre esas columnas)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_created_at ON images (created_at, id)"
     )
 
-    # Crear tabla de leaderboard
+    # /images/?user_id= y /images/?style=: WHERE user_id = ? (o style = ?) [AND created_at BETWEEN]
+    # ORDER BY created_at DESC, id DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_user_created_at ON images (user_id, created_at, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_style_created_at ON images (style, created_at, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at, id)"
+    )
+
+    # migrate_images_chunk (en cada arranque): solo las filas sin sha256, así una base ya migrada
+    # no recorre toda la tabla (ni las páginas de los blobs) para confirmar que no queda nada
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_images_unmigrated ON images (id) WHERE sha256 IS NULL"
+    )
+
+    # /cocteles/leaderboard sin filtro: ORDER BY score DESC, date DESC, id DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_score ON leaderboard (score, date, id)"
+    )
+
+    # /cocteles/leaderboard?game=: WHERE game = ? ORDER BY score DESC, date DESC, id DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_game_score ON leaderboard (game, score, date, id)"
+    )
+
+
+def _add_missing_columns(cursor, table: str, columns: dict):
+    """Agregar a una tabla existente las columnas que todavía no tiene"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _encode_image_data(image_data):
+    """Convertir los bytes guardados a base64 para las respuestas (las filas sin migrar ya son texto)"""
+    if isinstance(image_data, (bytes, memoryview)):
+        return base64.b64encode(image_data).decode("ascii")
+    return image_data
+
+
+def _store_image_bytes(cursor, image_data: bytes):
+    """
+    Guardar los bytes en el backend configurado y sumar una referencia a su contenido
+    Retorna (valor para la columna image_data, sha256). Si el contenido ya existía en disco
+    (o ya está en un pack) no se vuelve a escribir
+    """
+    digest = compute_digest(image_data)
+    if image_storage.inline:
+        return sqlite3.Binary(image_data), digest
+
+    if not _is_packed(cursor, digest):
+        image_storage.put(digest, image_data)
+    _add_blob_reference(cursor, digest, len(image_data))
+    return b"", digest
+
+
+def _is_packed(cursor, digest: str) -> bool:
+    """True si el contenido ya está en un pack (no hace falta un archivo suelto: se lee del pack)"""
+    cursor.execute("SELECT 1 FROM image_pack_entries WHERE sha256 = ?", (digest,))
+    return cursor.fetchone() is not None
+
+
+def _add_blob_reference(cursor, digest: str, size_bytes: int):
+    """Sumar una referencia a un contenido guardado fuera de la base de datos"""
     cursor.execute(
         """
-        CREATE TABLE IF NOT EXISTS leaderboard (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            game TEXT NOT NULL,
-            position INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        INSERT INTO image_blobs (sha256, size_bytes, refcount) VALUES (?, ?, 1)
+        ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1
+        """,
+        (digest, size_bytes),
+    )
+
+
+def _load_image_bytes(image_data, digest):
+    """
+    Obtener los bytes de una imagen, leyéndolos del backend (o del pack) si no están en la tabla
+    Usa su propia conexión de lectura: llamarla después de liberar la del caller
+    """
+    if image_data or not digest:
+        return image_data
+    stored = image_storage.get(digest)
+    if stored is None:
+        stored = _load_packed_bytes(digest)
+    return stored
+
+
+def _load_packed_bytes(digest: str):
+    """Bytes de una imagen compactada (memoryview sobre el pack, sin copiar). None si no está en un pack"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT pack_id, offset, size_bytes FROM image_pack_entries WHERE sha256 = ?",
+            (digest,),
         )
+        result = cursor.fetchone()
+    if not result:
+        return None
+    return image_packs.read(*result)
+
+
+def _release_all_image_blobs(cursor):
+    """Olvidar todos los contenidos guardados fuera de la base de datos. Retorna sus SHA-256"""
+    cursor.execute("SELECT sha256 FROM image_blobs")
+    digests = [row[0] for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM image_blobs")
+    cursor.execute("DELETE FROM image_pack_entries")
+    return digests
+
+
+def _delete_stored_files(digests):
     """
+    Borrar del backend los contenidos liberados (después del commit, por si hubo rollback)
+    Se hace con la conexión de escritura tomada, igual que los put: un put concurrente del mismo contenido
+    no puede colarse entre la verificación y el borrado. Solo se borran los que nadie volvió a referenciar
+    como archivo suelto (sin fila en image_blobs, o ya guardados en un pack)
+    """
+    if not digests or image_storage.inline:
+        return
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        for digest in digests:
+            cursor.execute(
+                """
+                SELECT 1 FROM image_blobs b
+                WHERE b.sha256 = ? AND NOT EXISTS (SELECT 1 FROM image_pack_entries p WHERE p.sha256 = b.sha256)
+                """,
+                (digest,),
+            )
+            if cursor.fetchone() is None:
+                image_storage.delete(digest)
+
+
+def _insert_image_metadata_row(cursor, stored_data, mime_type: str, size_bytes: int, digest: str, metadata: dict = None):
+    """Insertar la fila de una imagen con sus metadatos opcionales (style, user_id, timestamp, width, height)"""
+    metadata = metadata or {}
+    values = [metadata.get(column) for column in IMAGE_METADATA_COLUMNS]
+    if values[2] is not None:
+        # El frontend manda el timestamp como número o texto; se guarda siempre como texto
+        values[2] = str(values[2])
+
+    columns = ("image_data", "mime_type", "size_bytes", "sha256") + IMAGE_METADATA_COLUMNS
+    cursor.execute(
+        f"INSERT INTO images ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        (stored_data, mime_type, size_bytes, digest, *values),
     )
+    return cursor.lastrowid
+
+
+def _insert_image_row(cursor, image_data: bytes, mime_type: str = None, metadata: dict = None):
+    """Guardar los bytes e insertar la fila de la imagen dentro de la transacción actual"""
+    mime_type = detect_mime_type(image_data) or mime_type
+    stored_data, digest = _store_image_bytes(cursor, image_data)
+    return _insert_image_metadata_row(cursor, stored_data, mime_type, len(image_data), digest, metadata)
+
 
-    conn.commit()
-    conn.close()
+def insert_image(image_data: bytes, mime_type: str = None, metadata: dict = None):
+    """
+    Insertar una nueva imagen (bytes ya decodificados). El tipo detectado tiene prioridad sobre el declarado
+    metadata: dict opcional con style, user_id, timestamp, width y height
+    """
+    with write_connection() as conn:
+        return _insert_image_row(conn.cursor(), image_data, mime_type, metadata)
 
 
-def get_connection():
-    """Obtener conexión a la base de datos"""
-    return sqlite3.connect(DATABASE_PATH)
+def _insert_image_file_row(cursor, file_path: str, digest: str, size_bytes: int, mime_type: str = None, metadata: dict = None):
+    """Insertar una imagen recibida en un archivo temporal dentro de una transacción ya abierta"""
+    if image_storage.inline:
+        try:
+            with open(file_path, "rb") as file:
+                image_data = file.read()
+        finally:
+            os.remove(file_path)
+        return _insert_image_row(cursor, image_data, mime_type, metadata)
 
+    if _is_packed(cursor, digest):
+        os.remove(file_path)
+    else:
+        image_storage.adopt(digest, file_path)
+    _add_blob_reference(cursor, digest, size_bytes)
+    return _insert_image_metadata_row(cursor, b"", mime_type, size_bytes, digest, metadata)
 
-def insert_image(image_data: str):
-    """Insertar una nueva imagen"""
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("INSERT INTO images (image_data) VALUES (?)", (image_data,))
+def insert_image_file(file_path: str, digest: str, size_bytes: int, mime_type: str = None, metadata: dict = None):
+    """
+    Insertar una imagen que ya fue recibida en un archivo temporal (subidas en streaming)
+    El archivo se mueve al almacenamiento sin volver a leerlo; con el backend "database"
+    se lee para guardarlo en la tabla. El archivo temporal deja de existir en ambos casos
+    """
+    with write_connection() as conn:
+        return _insert_image_file_row(conn.cursor(), file_path, digest, size_bytes, mime_type, metadata)
+
+
+def insert_image_files(files: list):
+    """
+    Como insert_image_file pero con varias imágenes en una sola transacción
+    files: lista de tuplas (ruta, digest, tamaño, mime_type, metadata). Retorna los ids en el mismo orden
+    """
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        return [_insert_image_file_row(cursor, *image_file) for image_file in files]
 
-    image_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
 
-    return image_id
+def insert_images(images: list):
+    """
+    Insertar varias imágenes en una sola transacción (un solo commit)
+    images: lista de tuplas (bytes, mime_type, metadata). Retorna los ids en el mismo orden
+    """
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        return [
+            _insert_image_row(cursor, image_data, mime_type, metadata)
+            for image_data, mime_type, metadata in images
+        ]
 
 
 def insert_user(username: str, email: str, time: str):
     """Insertar un nuevo usuario"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (username, email, time) VALUES (?, ?, ?)",
+            (username, email, time),
+        )
+        return cursor.lastrowid
 
-    cursor.execute(
-        "INSERT INTO users (username, email, time) VALUES (?, ?, ?)",
-        (username, email, time),
-    )
 
-    user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+def _build_page_query(select_sql: str, sort_columns: tuple, filters: list = None, params: list = None, limit: int = 50, offset: int = 0, after=None):
+    """
+    Armar un SELECT paginado, ordenado de forma descendente por sort_columns
+    - Con after (valores de sort_columns de la última fila vista) usa keyset: WHERE (cols) < (valores),
+      así las páginas profundas cuestan lo mismo que la primera y no hay saltos ni duplicados
+    - Sin after usa LIMIT/OFFSET como antes
+    Pide limit + 1 filas para saber si hay otra página. Retorna (sql, params)
+    """
+    filters = list(filters or [])
+    params = list(params or [])
+
+    if after is not None:
+        filters.append(f"({', '.join(sort_columns)}) < ({', '.join('?' for _ in sort_columns)})")
+        params.extend(after)
+
+    query = select_sql
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY " + ", ".join(f"{column} DESC" for column in sort_columns)
+
+    # Pedir una fila de más para saber si hay otra página
+    query += " LIMIT ?"
+    params.append(limit + 1)
+    if after is None:
+        query += " OFFSET ?"
+        params.append(offset)
 
-    return user_id
+    return query, params
+
+
+def _fetch_page(cursor, select_sql: str, sort_columns: tuple, limit: int = 50, **kwargs):
+    """Ejecutar un SELECT paginado (ver _build_page_query). Retorna (filas, has_more)"""
+    query, params = _build_page_query(select_sql, sort_columns, limit=limit, **kwargs)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
 
 
 def get_image(image_id: int):
-    """Obtener una imagen por ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """Obtener una imagen por ID (los bytes salen del caché en memoria si están)"""
+    generation = image_cache.generation
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT id, created_at, mime_type, size_bytes, sha256, {', '.join(IMAGE_METADATA_COLUMNS)} "
+            "FROM images WHERE id = ?",
+            (image_id,),
+        )
+        result = cursor.fetchone()
+        if not result:
+            return None
+
+        # El caché va por sha256: un id reutilizado después de limpiar la tabla (en este u otro
+        # proceso) tiene otro sha256 y no puede recibir los bytes de la imagen anterior
+        digest = result[4]
+        image_data = image_cache.get(digest) if digest else None
+        if image_data is None:
+            cursor.execute("SELECT image_data FROM images WHERE id = ?", (image_id,))
+            stored = cursor.fetchone()
+            if not stored:
+                return None
+
+    if image_data is None:
+        image_data = _load_image_bytes(stored[0], digest)
+        if digest and isinstance(image_data, (bytes, memoryview)) and image_data:
+            image_cache.put(digest, image_data, len(image_data), generation)
+
+    image = {
+        "id": result[0],
+        "image_data": _encode_image_data(image_data),
+        "created_at": result[1],
+        "mime_type": result[2],
+        "size_bytes": result[3],
+    }
+    image.update(zip(IMAGE_METADATA_COLUMNS, result[5:]))
+    return image
+
+
+def get_image_content(image_id: int):
+    """
+    Obtener el contenido binario de una imagen para servirlo directamente
+    Retorna un dict con mime_type, size_bytes, sha256 y "data" (bytes, del caché en memoria o de la base)
+    o "path" (archivo en disco demasiado grande para el caché, sin leerlo). None si no existe
+    """
+    generation = image_cache.generation
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT mime_type, size_bytes, sha256 FROM images WHERE id = ?", (image_id,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+
+        mime_type, size_bytes, digest = result
+        cached = image_cache.get(digest) if digest else None
+        if cached is not None:
+            return {
+                "mime_type": mime_type or detect_mime_type(cached),
+                "size_bytes": len(cached),
+                "sha256": digest,
+                "path": None,
+                "data": cached,
+            }
 
-    cursor.execute(
-        "SELECT id, image_data, created_at FROM images WHERE id = ?", (image_id,)
-    )
+        cursor.execute("SELECT image_data FROM images WHERE id = ?", (image_id,))
+        stored = cursor.fetchone()
+
+    if not stored:
+        return None
+
+    image_data = stored[0]
+    content = {"mime_type": mime_type, "size_bytes": size_bytes, "sha256": digest, "path": None, "data": None}
+
+    if isinstance(image_data, str):
+        # Fila antigua todavía sin migrar; con base64 inválido queda sin contenido (404)
+        try:
+            image_data = base64.b64decode(image_data)
+        except (binascii.Error, ValueError):
+            return content
+
+    if image_data:
+        content["data"] = image_data
+        content["size_bytes"] = len(image_data)
+        content["mime_type"] = mime_type or detect_mime_type(image_data)
+    elif digest:
+        path = image_storage.path(digest)
+        if path is not None and (size_bytes or 0) > image_cache.max_item_bytes and os.path.exists(path):
+            content["path"] = path
+        else:
+            # Las imágenes que entran en el caché se leen completas para guardarlas en memoria;
+            # las compactadas se leen del pack como un slice del mmap
+            content["data"] = _load_image_bytes(None, digest)
 
-    result = cursor.fetchone()
-    conn.close()
+    # Las filas sin migrar (sin sha256) no se guardan en el caché
+    if content["data"] and digest:
+        image_cache.put(digest, content["data"], len(content["data"]), generation)
 
-    if result:
-        return {"id": result[0], "image_data": result[1], "created_at": result[2]}
-    return None
+    return content
 
 
 def get_user(user_id: int):
     """Obtener un usuario por ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT id, username, email, time, created_at FROM users WHERE id = ?",
-        (user_id,),
-    )
-
-    result = cursor.fetchone()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, username, email, time, created_at FROM users WHERE id = ?",
+            (user_id,),
+        )
+        result = cursor.fetchone()
 
     if result:
         return {
@@ -131,48 +684,106 @@ def get_user(user_id: int):
     return None
 
 
-def get_all_images(limit: int = 50, offset: int = 0):
-    """Obtener todas las imágenes con paginación"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT id, created_at, image_data FROM images ORDER BY created_at DESC LIMIT ? OFFSET ?",
-        (limit, offset),
-    )
-
-    results = cursor.fetchall()
-
-    # Obtener el total de imágenes
-    cursor.execute("SELECT COUNT(*) FROM images")
-    total = cursor.fetchone()[0]
+def _image_filters(user_id: str = None, style: str = None, created_from: str = None, created_to: str = None):
+    """Condiciones WHERE para los filtros del listado de imágenes. Retorna (filtros, parámetros)"""
+    filters, params = [], []
+    if user_id is not None:
+        filters.append("user_id = ?")
+        params.append(user_id)
+    if style is not None:
+        filters.append("style = ?")
+        params.append(style)
+    if created_from is not None:
+        filters.append("created_at >= ?")
+        params.append(created_from)
+    if created_to is not None:
+        filters.append("created_at < ?")
+        params.append(created_to)
+    return filters, params
+
+
+def get_all_images(limit: int = 50, offset: int = 0, after: tuple = None, include_data: bool = False,
+                   user_id: str = None, style: str = None, created_from: str = None, created_to: str = None,
+                   include_total: bool = True):
+    """
+    Obtener todas las imágenes con paginación (after = (created_at, id) para paginar por cursor)
+    Filtros opcionales por user_id, style y rango de created_at [created_from, created_to),
+    resueltos con los índices idx_images_*; el total sale de table_stats salvo al combinar filtros
+    Por defecto solo retorna metadatos; con include_data=True también el base64 (formato anterior)
+    Con include_total=False no se calcula el total (total = None), útil para el scroll infinito
+    """
+    filters, params = _image_filters(user_id, style, created_from, created_to)
+
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        data_column = "image_data" if include_data else "NULL"
+        results, has_more = _fetch_page(
+            cursor,
+            f"SELECT id, created_at, mime_type, size_bytes, sha256, {', '.join(IMAGE_METADATA_COLUMNS)}, "
+            f"{data_column} FROM images",
+            ("created_at", "id"),
+            filters=filters,
+            params=params,
+            limit=limit,
+            offset=offset,
+            after=after,
+        )
 
-    conn.close()
+        # Obtener el total de imágenes: de los contadores si hay a lo sumo un filtro por usuario
+        # o por estilo; al combinar filtros se cuenta sobre el índice
+        if not include_total:
+            total = None
+        elif not filters:
+            total, _ = _get_counter(cursor, "images")
+        elif filters == ["user_id = ?"]:
+            total, _ = _get_counter(cursor, "images_user", user_id)
+        elif filters == ["style = ?"]:
+            total, _ = _get_counter(cursor, "images_style", style)
+        else:
+            cursor.execute("SELECT COUNT(*) FROM images WHERE " + " AND ".join(filters), params)
+            total = cursor.fetchone()[0]
 
     images = []
     for result in results:
-        images.append({"id": result[0], "created_at": result[1], "image_data": result[2]})
-
-    return {"images": images, "total": total, "limit": limit, "offset": offset}
-
-
-def get_all_users(limit: int = 50, offset: int = 0):
-    """Obtener todos los usuarios con paginación"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT id, username, email, time, created_at FROM users ORDER BY created_at DESC LIMIT ? OFFSET ?",
-        (limit, offset),
-    )
-
-    results = cursor.fetchall()
-
-    # Obtener el total de usuarios
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total = cursor.fetchone()[0]
+        image = {
+            "id": result[0],
+            "created_at": result[1],
+            "mime_type": result[2],
+            "size_bytes": result[3],
+            "sha256": result[4],
+        }
+        image.update(zip(IMAGE_METADATA_COLUMNS, result[5:-1]))
+        if include_data:
+            image["image_data"] = _encode_image_data(_load_image_bytes(result[-1], result[4]))
+        images.append(image)
+
+    next_after = (images[-1]["created_at"], images[-1]["id"]) if has_more else None
+
+    return {
+        "images": images,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+        "next_after": next_after,
+    }
+
+
+def get_all_users(limit: int = 50, offset: int = 0, after: tuple = None):
+    """Obtener todos los usuarios con paginación (after = (created_at, id) para paginar por cursor)"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        results, has_more = _fetch_page(
+            cursor,
+            "SELECT id, username, email, time, created_at FROM users",
+            ("created_at", "id"),
+            limit=limit,
+            offset=offset,
+            after=after,
+        )
 
-    conn.close()
+        # Obtener el total de usuarios
+        total, _ = _get_counter(cursor, "users")
 
     users = []
     for result in results:
@@ -186,158 +797,396 @@ def get_all_users(limit: int = 50, offset: int = 0):
             }
         )
 
-    return {"users": users, "total": total, "limit": limit, "offset": offset}
+    next_after = (users[-1]["created_at"], users[-1]["id"]) if has_more else None
+
+    return {
+        "users": users,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+        "next_after": next_after,
+    }
 
 
 def reset_database():
     """Resetear completamente la base de datos (eliminar todas las tablas y recrearlas)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with write_connection() as conn:
+        cursor = conn.cursor()
+
+        released = _release_all_image_blobs(cursor)
+
         # Eliminar todas las tablas
         cursor.execute("DROP TABLE IF EXISTS images")
+        cursor.execute("DROP TABLE IF EXISTS image_blobs")
+        cursor.execute("DROP TABLE IF EXISTS image_pack_entries")
         cursor.execute("DROP TABLE IF EXISTS users")
         cursor.execute("DROP TABLE IF EXISTS leaderboard")
-        
-        conn.commit()
-        conn.close()
-        
-        # Reinicializar la base de datos
-        init_database()
-        
-        return True
-    except Exception as e:
-        conn.close()
-        raise e
+        cursor.execute("DROP TABLE IF EXISTS table_stats")
+
+    # Reinicializar la base de datos (antes de borrar los archivos, que consulta image_blobs)
+    init_database()
+
+    _delete_stored_files(released)
+    image_packs.clear()
+    image_cache.clear()
+
+    return True
 
 
 def clear_all_data():
     """Limpiar todos los datos pero mantener la estructura de las tablas"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with write_connection() as conn:
+        cursor = conn.cursor()
+
         # Limpiar todas las tablas
         cursor.execute("DELETE FROM images")
         cursor.execute("DELETE FROM users")
         cursor.execute("DELETE FROM leaderboard")
-        
+        released = _release_all_image_blobs(cursor)
+
         # Resetear los contadores de autoincrement
         cursor.execute("DELETE FROM sqlite_sequence WHERE name='images'")
         cursor.execute("DELETE FROM sqlite_sequence WHERE name='users'")
         cursor.execute("DELETE FROM sqlite_sequence WHERE name='leaderboard'")
-        
-        conn.commit()
-        conn.close()
-        
-        return True
-    except Exception as e:
-        conn.close()
-        raise e
+
+    _delete_stored_files(released)
+    image_packs.clear()
+    image_cache.clear()
+
+    return True
+
+
+def count_rows(table: str):
+    """Contar los registros de una tabla"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        return _get_counter(cursor, table)[0]
+
+
+def clear_table(table: str):
+    """Eliminar todos los registros de una tabla y resetear su autoincrement. Retorna cuántos se eliminaron"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+
+    with write_connection() as conn:
+        cursor = conn.cursor()
+
+        # Contar registros antes
+        count_before, _ = _get_counter(cursor, table)
+
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+
+        released = _release_all_image_blobs(cursor) if table == "images" else []
+
+    _delete_stored_files(released)
+    if table == "images":
+        image_packs.clear()
+        image_cache.clear()
+
+    return count_before
+
+
+def migrate_images_chunk(after_id: int = 0, chunk_size: int = 200):
+    """
+    Migrar un bloque de imágenes antiguas (base64 en TEXT o bytes sin sha256) al formato actual:
+    bytes en el backend configurado más mime, tamaño y sha256
+    Procesa las filas con id > after_id en una sola transacción corta, para no bloquear
+    al resto de escrituras. Retorna (convertidas, último id procesado) o None si ya no quedan filas
+    Las filas con base64 inválido se dejan como están y se saltan
+    """
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, image_data, mime_type FROM images WHERE id > ? AND sha256 IS NULL ORDER BY id LIMIT ?",
+            (after_id, chunk_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+
+        converted = 0
+        for image_id, image_data, mime_type in rows:
+            if isinstance(image_data, str):
+                try:
+                    image_data = base64.b64decode(image_data)
+                except (binascii.Error, ValueError):
+                    continue
+
+            stored_data, digest = _store_image_bytes(cursor, image_data)
+            cursor.execute(
+                "UPDATE images SET image_data = ?, mime_type = ?, size_bytes = ?, sha256 = ? WHERE id = ?",
+                (
+                    stored_data,
+                    detect_mime_type(image_data) or mime_type,
+                    len(image_data),
+                    digest,
+                    image_id,
+                ),
+            )
+            converted += 1
+
+    return converted, rows[-1][0]
+
+
+def migrate_images_to_blob(chunk_size: int = 200, progress=None):
+    """
+    Migrar todas las imágenes antiguas al formato actual por bloques
+    Se puede interrumpir y volver a ejecutar: solo toca filas que todavía no tienen sha256
+    """
+    total_converted = 0
+    last_id = 0
+    while True:
+        result = migrate_images_chunk(last_id, chunk_size)
+        if result is None:
+            break
+        converted, last_id = result
+        total_converted += converted
+        if progress:
+            progress(total_converted, last_id)
+
+    return total_converted
+
+
+# Imágenes candidatas a compactar: más viejas que el corte y con bytes todavía en la tabla
+# o en el almacenamiento en disco (su contenido aún no está en un pack)
+_COMPACTION_CANDIDATES = """
+    FROM images
+    WHERE created_at < ? AND sha256 IS NOT NULL
+      AND (length(image_data) > 0
+           OR NOT EXISTS (SELECT 1 FROM image_pack_entries p WHERE p.sha256 = images.sha256))
+"""
+
+
+def compaction_cutoff(max_age_days: float) -> str:
+    """created_at límite (UTC, mismo formato que CURRENT_TIMESTAMP) para compactar imágenes"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def compact_images_chunk(older_than: str, after: tuple = None, chunk_size: int = 200):
+    """
+    Mover a los packs los bytes de un bloque de imágenes creadas antes de older_than
+    Recorre por (created_at, id) desde after en una sola transacción corta. Cada contenido se agrega
+    una sola vez al pack; las filas quedan con image_data vacío y se leen por su sha256
+    Retorna (compactadas, (created_at, id) de la última fila) o None si ya no quedan filas
+    """
+    after = after or ("", 0)
+    packed_digests = []
+
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT created_at, id, image_data, sha256 {_COMPACTION_CANDIDATES} "
+            "AND (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+            (older_than, *after, chunk_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+
+        compacted = 0
+        for created_at, image_id, image_data, digest in rows:
+            if not _is_packed(cursor, digest):
+                data = image_data or image_storage.get(digest)
+                if not isinstance(data, bytes) or not data:
+                    # Sin migrar o archivo perdido: se deja como está
+                    continue
+                pack_id, offset = image_packs.append(data)
+                cursor.execute(
+                    "INSERT INTO image_pack_entries (sha256, pack_id, offset, size_bytes) VALUES (?, ?, ?, ?)",
+                    (digest, pack_id, offset, len(data)),
+                )
+                packed_digests.append(digest)
+
+            if image_data:
+                cursor.execute("UPDATE images SET image_data = ? WHERE id = ?", (b"", image_id))
+            compacted += 1
+
+        # El pack tiene que estar en disco antes de que la base apunte a él
+        image_packs.sync()
+
+    # Recién después del commit se borran los archivos sueltos que ahora están en un pack
+    _delete_stored_files(packed_digests)
+
+    return compacted, tuple(rows[-1][:2])
+
+
+def compact_images(max_age_days: float, chunk_size: int = 200, progress=None):
+    """
+    Compactar todas las imágenes más viejas que max_age_days por bloques
+    Se puede interrumpir y volver a ejecutar (también con el servidor encendido)
+    """
+    older_than = compaction_cutoff(max_age_days)
+    total_compacted = 0
+    after = None
+    while True:
+        result = compact_images_chunk(older_than, after, chunk_size)
+        if result is None:
+            break
+        compacted, after = result
+        total_compacted += compacted
+        if progress:
+            progress(total_compacted, after[1])
+
+    return total_compacted
+
+
+def get_compaction_status(max_age_days: float):
+    """Cuántas imágenes esperan ser compactadas y cuánto hay ya en packs"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*) {_COMPACTION_CANDIDATES}", (compaction_cutoff(max_age_days),)
+        )
+        pending = cursor.fetchone()[0]
+        packed_count, packed_bytes = _get_counter(cursor, "image_pack_entries")
+
+    pack_stats = image_packs.stats()
+    return {
+        "max_age_days": max_age_days,
+        "pending_images": pending,
+        "packed_contents": packed_count,
+        "packed_bytes": packed_bytes,
+        "pack_files": pack_stats["files"],
+        "pack_size_bytes": pack_stats["size_bytes"],
+    }
 
 
 def insert_leaderboard_entry(game: str, position: int, name: str, score: int, date: str, timestamp: str):
     """Insertar una nueva entrada del leaderboard"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO leaderboard (game, position, name, score, date, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (game, position, name, score, date, timestamp),
+        )
+        return cursor.lastrowid
 
-    cursor.execute(
-        "INSERT INTO leaderboard (game, position, name, score, date, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
-        (game, position, name, score, date, timestamp),
-    )
 
-    entry_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+def insert_leaderboard_entries(game: str, timestamp: str, entries: list):
+    """
+    Insertar todas las entradas de un leaderboard en una sola transacción (un solo commit)
+    entries: lista de dicts con position, name, score y date. Retorna los ids generados en el mismo orden
+    """
+    if not entries:
+        return []
+
+    rows = [
+        (game, entry["position"], entry["name"], entry["score"], entry["date"], timestamp)
+        for entry in entries
+    ]
+
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO leaderboard (game, position, name, score, date, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+        # Con el lock de escritura tomado, AUTOINCREMENT asigna ids consecutivos dentro de la transacción
+        cursor.execute("SELECT last_insert_rowid()")
+        last_id = cursor.fetchone()[0]
 
-    return entry_id
+    first_id = last_id - len(rows) + 1
+    return list(range(first_id, last_id + 1))
 
 
-def get_leaderboard(game: str = None, limit: int = 50, offset: int = 0):
-    """Obtener entradas del leaderboard con filtros opcionales, ordenadas por score descendente"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_leaderboard(game: str = None, limit: int = 50, offset: int = 0, after: tuple = None):
+    """
+    Obtener entradas del leaderboard con filtros opcionales, ordenadas por score descendente
+    after = (score, date, id) de la última entrada vista para paginar por cursor
+    """
+    with read_connection() as conn:
+        cursor = conn.cursor()
 
-    try:
         if game:
             # Primero obtener el total para el juego específico
-            cursor.execute("SELECT COUNT(*) FROM leaderboard WHERE game = ?", (game,))
-            total = cursor.fetchone()[0]
-            
-            # Luego obtener los datos
-            cursor.execute(
-                "SELECT id, game, position, name, score, date, timestamp, created_at FROM leaderboard WHERE game = ? ORDER BY score DESC, date DESC LIMIT ? OFFSET ?",
-                (game, limit, offset),
-            )
+            total, _ = _get_counter(cursor, "leaderboard_game", game)
+            filters, params = ["game = ?"], [game]
         else:
             # Primero obtener el total general
-            cursor.execute("SELECT COUNT(*) FROM leaderboard")
-            total = cursor.fetchone()[0]
-            
-            # Luego obtener los datos
-            cursor.execute(
-                "SELECT id, game, position, name, score, date, timestamp, created_at FROM leaderboard ORDER BY score DESC, date DESC LIMIT ? OFFSET ?",
-                (limit, offset),
-            )
+            total, _ = _get_counter(cursor, "leaderboard")
+            filters, params = [], []
+
+        # Luego obtener los datos
+        results, has_more = _fetch_page(
+            cursor,
+            "SELECT id, game, position, name, score, date, timestamp, created_at FROM leaderboard",
+            ("score", "date", "id"),
+            filters=filters,
+            params=params,
+            limit=limit,
+            offset=offset,
+            after=after,
+        )
 
-        results = cursor.fetchall()
-        conn.close()
+    entries = []
+    for result in results:
+        entries.append({
+            "id": result[0],
+            "game": result[1],
+            "position": result[2],
+            "name": result[3],
+            "score": result[4],
+            "date": result[5],
+            "timestamp": result[6],
+            "created_at": result[7]
+        })
+
+    next_after = (
+        (entries[-1]["score"], entries[-1]["date"], entries[-1]["id"]) if has_more else None
+    )
 
-        entries = []
-        for result in results:
-            entries.append({
-                "id": result[0],
-                "game": result[1],
-                "position": result[2],
-                "name": result[3],
-                "score": result[4],
-                "date": result[5],
-                "timestamp": result[6],
-                "created_at": result[7]
-            })
-
-        return {"entries": entries, "total": total, "limit": limit, "offset": offset}
-        
-    except Exception as e:
-        conn.close()
-        raise e
+    return {
+        "entries": entries,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+        "next_after": next_after,
+    }
 
 
 def get_database_stats():
     """Obtener estadísticas de la base de datos"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Contar imágenes
-        cursor.execute("SELECT COUNT(*) FROM images")
-        images_count = cursor.fetchone()[0]
-        
-        # Contar usuarios
-        cursor.execute("SELECT COUNT(*) FROM users")
-        users_count = cursor.fetchone()[0]
-        
-        # Contar entradas del leaderboard
-        cursor.execute("SELECT COUNT(*) FROM leaderboard")
-        leaderboard_count = cursor.fetchone()[0]
-        
-        # Obtener tamaño del archivo de base de datos
-        db_size = os.path.getsize(DATABASE_PATH) if os.path.exists(DATABASE_PATH) else 0
-        
-        conn.close()
-        
-        return {
-            "images_count": images_count,
-            "users_count": users_count,
-            "leaderboard_count": leaderboard_count,
-            "database_size_bytes": db_size,
-            "database_size_mb": round(db_size / (1024 * 1024), 2),
-            "database_path": DATABASE_PATH
-        }
-    except Exception as e:
-        conn.close()
-        raise e
+    with read_connection() as conn:
+        cursor = conn.cursor()
+
+        # Totales mantenidos por los triggers de table_stats
+        images_count, _ = _get_counter(cursor, "images")
+        users_count, _ = _get_counter(cursor, "users")
+        leaderboard_count, _ = _get_counter(cursor, "leaderboard")
+
+        # Contenidos únicos guardados fuera de la base de datos (y los compactados en packs)
+        stored_files, stored_bytes = _get_counter(cursor, "image_blobs")
+        packed_count, packed_bytes = _get_counter(cursor, "image_pack_entries")
+
+    # Obtener tamaño del archivo de base de datos (incluyendo el WAL pendiente de checkpoint)
+    db_size = os.path.getsize(DATABASE_PATH) if os.path.exists(DATABASE_PATH) else 0
+    wal_path = f"{DATABASE_PATH}-wal"
+    if os.path.exists(wal_path):
+        db_size += os.path.getsize(wal_path)
+
+    return {
+        "images_count": images_count,
+        "users_count": users_count,
+        "leaderboard_count": leaderboard_count,
+        "database_size_bytes": db_size,
+        "database_size_mb": round(db_size / (1024 * 1024), 2),
+        "database_path": DATABASE_PATH,
+        "image_storage_backend": config.IMAGE_STORAGE_BACKEND,
+        "image_store_files": stored_files,
+        "image_store_size_bytes": stored_bytes,
+        "image_store_size_mb": round(stored_bytes / (1024 * 1024), 2),
+        "image_packs_contents": packed_count,
+        "image_packs_size_mb": round(packed_bytes / (1024 * 1024), 2),
+        "image_cache": image_cache.stats(),
+    }
 
 
 # Inicializar la base de datos al importar el módulo
@@ -0,0 +1,79 @@
+"""
+Capa de acceso a datos asíncrona
+Ejecuta las funciones síncronas de database_simple fuera del event loop:
+las lecturas en un pool de hilos del tamaño del pool de conexiones y las escrituras
+en un único hilo dedicado (SQLite solo admite un escritor a la vez)
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database_simple
+from config import config
+
+_read_executor = ThreadPoolExecutor(
+    max_workers=config.DB_POOL_SIZE, thread_name_prefix="db-read"
+)
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+# Limita cuántas operaciones pueden estar en vuelo; el resto espera en el event loop
+# (así una request cancelada no llega a ejecutar su consulta)
+_semaphore = asyncio.Semaphore(config.DB_MAX_CONCURRENCY)
+
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    async with _semaphore:
+        return await loop.run_in_executor(
+            executor, functools.partial(func, *args, **kwargs)
+        )
+
+
+async def run_read(func, *args, **kwargs):
+    """Ejecutar una función de lectura en el pool de lectores"""
+    return await _run(_read_executor, func, *args, **kwargs)
+
+
+async def run_write(func, *args, **kwargs):
+    """Ejecutar una función de escritura en el hilo escritor"""
+    return await _run(_write_executor, func, *args, **kwargs)
+
+
+def _reader(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_read(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _writer(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_write(func, *args, **kwargs)
+
+    return wrapper
+
+
+# Lecturas
+get_image = _reader(database_simple.get_image)
+get_image_content = _reader(database_simple.get_image_content)
+get_user = _reader(database_simple.get_user)
+get_all_images = _reader(database_simple.get_all_images)
+get_all_users = _reader(database_simple.get_all_users)
+get_leaderboard = _reader(database_simple.get_leaderboard)
+get_database_stats = _reader(database_simple.get_database_stats)
+count_rows = _reader(database_simple.count_rows)
+
+# Escrituras
+insert_image = _writer(database_simple.insert_image)
+insert_images = _writer(database_simple.insert_images)
+insert_image_file = _writer(database_simple.insert_image_file)
+insert_image_files = _writer(database_simple.insert_image_files)
+insert_user = _writer(database_simple.insert_user)
+insert_leaderboard_entry = _writer(database_simple.insert_leaderboard_entry)
+insert_leaderboard_entries = _writer(database_simple.insert_leaderboard_entries)
+reset_database = _writer(database_simple.reset_database)
+clear_all_data = _writer(database_simple.clear_all_data)
+clear_table = _writer(database_simple.clear_table)
+migrate_images_chunk = _writer(database_simple.migrate_images_chunk)
@@ -8,8 +8,13 @@ from database_simple import (
     reset_database,
     clear_all_data,
     get_database_stats,
-    get_connection
+    count_rows,
+    clear_table,
+    migrate_images_to_blob,
+    compact_images,
+    get_compaction_status
 )
+from config import config
 
 def show_stats():
     """Mostrar estadísticas de la base de datos"""
@@ -62,15 +67,10 @@ def clear_data():
 def clear_images():
     """Limpiar solo las imágenes"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM images")
-        count = cursor.fetchone()[0]
+        count = count_rows("images")
         
         if count == 0:
             print("ℹ️  No hay imágenes para eliminar")
-            conn.close()
             return
         
         print(f"🖼️  Se eliminarán {count} imágenes")
@@ -78,13 +78,9 @@ def clear_images():
         
         if confirm.lower() != 's':
             print("❌ Operación cancelada")
-            conn.close()
             return
         
-        cursor.execute("DELETE FROM images")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='images'")
-        conn.commit()
-        conn.close()
+        count = clear_table("images")
         
         print(f"✅ {count} imágenes eliminadas")
         show_stats()
@@ -94,15 +90,10 @@ def clear_images():
 def clear_users():
     """Limpiar solo los usuarios"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        count = cursor.fetchone()[0]
+        count = count_rows("users")
         
         if count == 0:
             print("ℹ️  No hay usuarios para eliminar")
-            conn.close()
             return
         
         print(f"👥 Se eliminarán {count} usuarios")
@@ -110,24 +101,62 @@ def clear_users():
         
         if confirm.lower() != 's':
             print("❌ Operación cancelada")
-            conn.close()
             return
         
-        cursor.execute("DELETE FROM users")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='users'")
-        conn.commit()
-        conn.close()
+        count = clear_table("users")
         
         print(f"✅ {count} usuarios eliminados")
         show_stats()
     except Exception as e:
         print(f"❌ Error eliminando usuarios: {e}")
 
+def migrate_images():
+    """Migrar las imágenes base64 antiguas a BLOB (se puede ejecutar con el servidor encendido)"""
+    try:
+        print("🔄 Migrando imágenes de base64 a BLOB...")
+        converted = migrate_images_to_blob(
+            progress=lambda total, last_id: print(f"  ... {total} convertidas (último id: {last_id})")
+        )
+        print(f"✅ {converted} imágenes migradas")
+        show_stats()
+    except Exception as e:
+        print(f"❌ Error migrando imágenes: {e}")
+
+def compaction_status(max_age_days):
+    """Mostrar cuántas imágenes esperan ser compactadas y el tamaño de los packs"""
+    try:
+        status = get_compaction_status(max_age_days)
+        print(f"📦 Compactación de imágenes con más de {status['max_age_days']} días")
+        print("=" * 40)
+        print(f"⏳ Pendientes: {status['pending_images']}")
+        print(f"🗃️  Contenidos en packs: {status['packed_contents']}")
+        print(f"💾 Packs: {status['pack_files']} archivos, {round(status['pack_size_bytes'] / (1024 * 1024), 2)} MB")
+        print("=" * 40)
+    except Exception as e:
+        print(f"❌ Error obteniendo el estado de la compactación: {e}")
+
+def compact(max_age_days):
+    """Mover las imágenes antiguas a packs (se puede ejecutar con el servidor encendido)"""
+    try:
+        print(f"📦 Compactando imágenes con más de {max_age_days} días...")
+        compacted = compact_images(
+            max_age_days,
+            progress=lambda total, last_id: print(f"  ... {total} compactadas (último id: {last_id})")
+        )
+        print(f"✅ {compacted} imágenes compactadas")
+        print("ℹ️  Ejecuta VACUUM para devolver al sistema el espacio liberado en la base de datos")
+        compaction_status(max_age_days)
+    except Exception as e:
+        print(f"❌ Error compactando imágenes: {e}")
+
 def main():
     parser = argparse.ArgumentParser(description="Gestor de Base de Datos Halloween API")
     parser.add_argument("action", choices=[
-        "stats", "reset", "clear", "clear-images", "clear-users"
+        "stats", "reset", "clear", "clear-images", "clear-users", "migrate-images",
+        "compact-images", "compact-status"
     ], help="Acción a realizar")
+    parser.add_argument("--days", type=float, default=config.IMAGE_COMPACT_AFTER_DAYS,
+                        help="Edad mínima (en días) de las imágenes a compactar")
     
     if len(sys.argv) == 1:
         print("🎃 Gestor de Base de Datos Halloween API")
@@ -139,6 +168,9 @@ def main():
         print("  clear        - Limpiar todos los datos")
         print("  clear-images - Limpiar solo imágenes")
         print("  clear-users  - Limpiar solo usuarios")
+        print("  migrate-images - Migrar imágenes base64 a BLOB")
+        print("  compact-images - Mover imágenes antiguas a packs (--days N)")
+        print("  compact-status - Ver cuántas imágenes quedan por compactar")
         print("\nEjemplos:")
         print("  python db_manager.py stats")
         print("  python db_manager.py clear-images")
@@ -159,6 +191,12 @@ def main():
         clear_images()
     elif args.action == "clear-users":
         clear_users()
+    elif args.action == "migrate-images":
+        migrate_images()
+    elif args.action == "compact-images":
+        compact(args.days)
+    elif args.action == "compact-status":
+        compaction_status(args.days)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,122 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite en modo WAL
+    Mantiene un número acotado de conexiones de lectura y una única conexión de escritura,
+    así los lectores no bloquean al escritor y no se paga abrir/cerrar conexión por request
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        max_readers: int = 8,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 20000,
+        mmap_size_mb: int = 256,
+        acquire_timeout: float = 30.0,
+    ):
+        self.database_path = database_path
+        self.max_readers = max(1, max_readers)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.acquire_timeout = acquire_timeout
+
+        self._readers = queue.LifoQueue()
+        self._readers_created = 0
+        self._readers_lock = threading.Lock()
+
+        self._writer = None
+        self._writer_lock = threading.RLock()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Abrir una conexión nueva con los pragmas ajustados"""
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if self._readers_created < self.max_readers:
+                self._readers_created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect(read_only=True)
+            except Exception:
+                with self._readers_lock:
+                    self._readers_created -= 1
+                raise
+
+        try:
+            return self._readers.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a database reader connection")
+
+    @contextmanager
+    def reader(self):
+        """Tomar prestada una conexión de solo lectura del pool"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """
+        Usar la conexión de escritura (serializada con un lock)
+        Hace commit al salir del bloque o rollback si hubo una excepción
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+                self._writer.execute("PRAGMA journal_mode = WAL")
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self):
+        """Cerrar todas las conexiones abiertas del pool"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        with self._readers_lock:
+            while True:
+                try:
+                    conn = self._readers.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._readers_created -= 1
@@ -0,0 +1,142 @@
+"""
+Respuestas HTTP cacheables para contenido inmutable (bytes de imágenes)
+Las imágenes nunca cambian después de guardarse, así que usan ETag fuerte (el SHA-256),
+304 con If-None-Match, HEAD y peticiones por rango (Range)
+Los ids se reutilizan al vaciar las tablas: solo las URLs con la versión del contenido (?v=<sha256>)
+se cachean como immutable; las demás se revalidan con el ETag en cada uso
+"""
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Un año, el máximo recomendado
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# URL sin versión: el mismo id puede pasar a ser otra imagen
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Tamaño de las lecturas al servir un rango de un archivo
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(digest: str) -> str:
+    """ETag fuerte a partir del hash del contenido"""
+    return f'"{digest}"'
+
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    """Comparar If-None-Match con el ETag (comparación débil, como pide la RFC 9110)"""
+    if not header_value:
+        return False
+    if header_value.strip() == "*":
+        return True
+    candidates = [value.strip() for value in header_value.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def versioned_url(url: str, digest: str) -> str:
+    """Agregar la versión del contenido a una URL (así se puede cachear como immutable)"""
+    if not digest:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}v={digest}"
+
+
+def parse_range(header_value: str, size: int):
+    """
+    Interpretar un header Range de un solo rango ("bytes=0-99", "bytes=100-", "bytes=-500")
+    Retorna (inicio, fin) inclusivos, None si hay que ignorarlo (se responde completo)
+    o lanza ValueError si el rango no se puede satisfacer (416)
+    """
+    if not header_value or not header_value.startswith("bytes="):
+        return None
+
+    spec = header_value[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        # Varios rangos o sintaxis inválida: se permite ignorar el header
+        return None
+
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        start = int(start_text) if start_text else None
+        end = int(end_text) if end_text else None
+    except ValueError:
+        return None
+
+    if start is None:
+        # Sufijo: los últimos N bytes
+        if end is None:
+            return None
+        if end <= 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - end, 0), size - 1
+
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    if end is None or end >= size:
+        end = size - 1
+    return start, end
+
+
+def _read_file_range(path: str, start: int, length: int):
+    """Leer un rango de un archivo por partes (StreamingResponse lo itera en el threadpool)"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def immutable_response(
+    request: Request, digest: str, media_type: str, size: int, path: str = None, data: bytes = None, version: str = None
+):
+    """
+    Armar la respuesta para un contenido inmutable guardado en disco (path) o en memoria (data)
+    Maneja If-None-Match (304), If-Range, Range (206/416) y HEAD (solo headers)
+    Cache-Control immutable solo si la URL trae ?v= con la versión del contenido
+    (version, por defecto el mismo digest; en las variantes es el SHA-256 de la original)
+    """
+    etag = make_etag(digest)
+    versioned = request.query_params.get("v") == (version or digest)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    is_head = request.method == "HEAD"
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        if is_head:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        if path:
+            return FileResponse(path, media_type=media_type, headers=headers)
+        return Response(content=data, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+    if is_head:
+        return Response(status_code=206, headers=headers, media_type=media_type)
+
+    if path:
+        return StreamingResponse(
+            _read_file_range(path, start, length), status_code=206, media_type=media_type, headers=headers
+        )
+    return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
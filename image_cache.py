@@ -0,0 +1,69 @@
+"""
+Caché en memoria de los bytes de las imágenes más pedidas
+Durante un evento las galerías piden una y otra vez las mismas fotos recientes; con este caché
+esos pedidos no vuelven a leer el blob de SQLite ni el archivo en disco
+"""
+import threading
+from collections import OrderedDict
+
+
+class ImageByteCache:
+    """
+    Caché LRU con un máximo de bytes en total y por imagen
+    Es seguro usarlo desde varios hilos (las consultas corren en el pool de lectores)
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self._entries = OrderedDict()  # sha256 -> (bytes, tamaño), del menos al más usado
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Cambia en cada clear(): un valor leído antes de limpiar no se guarda después
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size: int, generation: int):
+        """Guardar un valor si entra en el caché y no hubo un clear() desde que se leyó"""
+        if size > self.max_item_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 3) if requests else 0.0,
+            }
@@ -0,0 +1,90 @@
+"""
+Archivos pack para las imágenes antiguas
+La compactación mueve los bytes de las imágenes viejas a archivos grandes de solo-agregar
+(000001.pack, 000002.pack, ...). La tabla image_pack_entries guarda dónde quedó cada una
+(pack, offset, tamaño) y la lectura mapea el pack en memoria y retorna un slice sin copiar
+"""
+import mmap
+import os
+import threading
+
+
+class PackStore:
+    """Packs de solo-agregar en un directorio, leídos con mmap"""
+
+    def __init__(self, root: str, max_pack_bytes: int):
+        self.root = root
+        self.max_pack_bytes = max_pack_bytes
+        self._maps = {}  # pack_id -> mmap (solo lectura)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_id = None
+
+    def _pack_path(self, pack_id: int) -> str:
+        return os.path.join(self.root, f"{pack_id:06d}.pack")
+
+    def _pack_ids(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            int(name[:-len(".pack")])
+            for name in os.listdir(self.root)
+            if name.endswith(".pack") and name[:-len(".pack")].isdigit()
+        )
+
+    def append(self, data: bytes):
+        """
+        Agregar una imagen al final del pack actual (se pasa al siguiente al llenarse)
+        Retorna (pack_id, offset). Llamar a sync() antes de confirmar la transacción que lo registra
+        """
+        if self._writer is None:
+            os.makedirs(self.root, exist_ok=True)
+            pack_ids = self._pack_ids()
+            self._writer_id = pack_ids[-1] if pack_ids else 1
+            self._writer = open(self._pack_path(self._writer_id), "ab")
+
+        offset = self._writer.tell()
+        if offset > 0 and offset + len(data) > self.max_pack_bytes:
+            self.sync()
+            self._writer.close()
+            self._writer_id += 1
+            self._writer = open(self._pack_path(self._writer_id), "ab")
+            offset = 0
+
+        self._writer.write(data)
+        return self._writer_id, offset
+
+    def sync(self):
+        """Dejar en disco lo agregado hasta ahora"""
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+
+    def read(self, pack_id: int, offset: int, size: int) -> memoryview:
+        """Bytes de una imagen como memoryview sobre el mmap del pack (sin copiar)"""
+        with self._lock:
+            pack_map = self._maps.get(pack_id)
+            if pack_map is None or offset + size > len(pack_map):
+                # Pack nuevo, o pack que creció desde que se mapeó
+                with open(self._pack_path(pack_id), "rb") as file:
+                    pack_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[pack_id] = pack_map
+        return memoryview(pack_map)[offset:offset + size]
+
+    def clear(self):
+        """Borrar todos los packs (al eliminar todas las imágenes)"""
+        with self._lock:
+            # Los mmap no se cierran: puede haber slices en uso (respuestas, caché); se liberan solos
+            self._maps = {}
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for pack_id in self._pack_ids():
+                os.remove(self._pack_path(pack_id))
+
+    def stats(self) -> dict:
+        pack_ids = self._pack_ids()
+        return {
+            "files": len(pack_ids),
+            "size_bytes": sum(os.path.getsize(self._pack_path(pack_id)) for pack_id in pack_ids),
+        }
@@ -0,0 +1,111 @@
+"""
+Backends de almacenamiento para los bytes de las imágenes
+La base de datos guarda siempre los metadatos (id, mime, tamaño, sha256); según el backend,
+los bytes se guardan dentro de la tabla images o en un directorio direccionado por contenido
+"""
+import os
+import tempfile
+import threading
+
+
+class DatabaseImageStorage:
+    """Los bytes se guardan dentro de la tabla images (comportamiento original)"""
+
+    inline = True
+
+    def staging_dir(self) -> str:
+        return tempfile.gettempdir()
+
+    def put(self, digest: str, data: bytes) -> bool:
+        return False
+
+    def adopt(self, digest: str, file_path: str) -> bool:
+        """Como put() con el contenido de un archivo ya escrito; el archivo deja de existir"""
+        try:
+            with open(file_path, "rb") as file:
+                return self.put(digest, file.read())
+        finally:
+            os.remove(file_path)
+
+    def get(self, digest: str):
+        return None
+
+    def path(self, digest: str):
+        return None
+
+    def delete(self, digest: str):
+        pass
+
+
+class FilesystemImageStorage:
+    """
+    Guarda cada imagen una sola vez en un directorio direccionado por su SHA-256,
+    repartido en subdirectorios (ab/cd/abcd...) para no tener miles de archivos en uno solo
+    """
+
+    inline = False
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, digest: str, data: bytes) -> bool:
+        """Escribir los bytes si todavía no existen. Retorna False si ya estaban guardados"""
+        path = self.path(digest)
+        if os.path.exists(path):
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Escribir en un archivo temporal y renombrar, así nunca se ve un archivo a medias
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        return True
+
+    def staging_dir(self) -> str:
+        """Directorio para las subidas en curso (mismo sistema de archivos, así adopt() es un rename)"""
+        path = os.path.join(self.root, "staging")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def adopt(self, digest: str, file_path: str) -> bool:
+        """
+        Mover un archivo ya escrito (p. ej. una subida en streaming) a su lugar definitivo
+        Si el contenido ya existía se descarta el archivo. Retorna False en ese caso
+        """
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(file_path)
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(file_path, path)
+        return True
+
+    def get(self, digest: str):
+        try:
+            with open(self.path(digest), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+def create_image_storage(backend: str, root: str):
+    """Crear el backend de almacenamiento configurado ("filesystem" o "database")"""
+    if backend == "filesystem":
+        return FilesystemImageStorage(root)
+    if backend == "database":
+        return DatabaseImageStorage()
+    raise ValueError(f"Unknown image storage backend: {backend}")
@@ -0,0 +1,177 @@
+"""
+Recepción de imágenes en streaming
+Los bytes se escriben a un archivo temporal a medida que llegan, calculando el SHA-256
+y controlando el tamaño por partes, así la memoria por subida no depende del tamaño de la imagen
+"""
+import asyncio
+import binascii
+import hashlib
+import os
+import uuid
+
+import aiofiles
+
+# Lo que no es del alfabeto base64 se descarta al decodificar (igual que base64.b64decode sin validate)
+_NON_BASE64 = bytes(
+    c for c in range(256)
+    if c not in b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+)
+
+
+def _decode_base64(encoded: bytes) -> bytes:
+    try:
+        return binascii.a2b_base64(encoded)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 format: {str(e)}")
+
+
+class UploadTooLarge(Exception):
+    """La subida superó el tamaño máximo permitido"""
+
+
+class StreamingImageUpload:
+    """Archivo temporal que recibe una imagen por partes"""
+
+    def __init__(self, staging_dir: str, max_bytes: int):
+        self.path = os.path.join(staging_dir, f"{uuid.uuid4().hex}.upload")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = None
+
+    async def open(self):
+        self._file = await aiofiles.open(self.path, "wb")
+        return self
+
+    async def write(self, chunk: bytes):
+        """Agregar una parte. Lanza UploadTooLarge apenas se pasa del máximo"""
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the maximum of {self.max_bytes} bytes")
+
+        self._hash.update(chunk)
+        await self._file.write(chunk)
+
+    async def close(self):
+        """Cerrar el archivo dejando los datos en disco"""
+        if self._file is not None:
+            await self._file.flush()
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+            await self._file.close()
+            self._file = None
+
+    async def discard(self):
+        """Cerrar y borrar el archivo temporal (subida rechazada o fallida)"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class Base64UploadSink:
+    """
+    Recibe un string base64 por partes (desde el parser JSON incremental), lo decodifica
+    de a bloques y lo escribe en un StreamingImageUpload
+    write() y close() son sincrónicos (los llama el parser) y solo acumulan; flush() decodifica
+    en el pool de workers (BoundedWorkerPool, o en un hilo si no se pasa) y hace la escritura async
+    """
+
+    _DECODE_BATCH = 64 * 1024
+
+    def __init__(self, upload: StreamingImageUpload, workers=None):
+        self.upload = upload
+        self.workers = workers
+        self.finished = False
+        self._encoded = bytearray()
+        self._opened = False
+        self._closed = False
+
+    def write(self, data: bytes):
+        self._encoded += data.translate(None, _NON_BASE64)
+
+    def close(self):
+        """Fin del string: lo que queda se decodifica en el próximo flush()"""
+        self.finished = True
+
+    async def flush(self):
+        """
+        Decodificar y escribir lo recibido hasta ahora (de a bloques de al menos _DECODE_BATCH)
+        Al terminar el string cierra el archivo. Lanza ValueError si el base64 no es válido
+        y WorkerPoolBusy si la cola del pool está llena
+        """
+        if self._closed:
+            return
+        if not self._opened:
+            await self.upload.open()
+            self._opened = True
+
+        length = len(self._encoded) if self.finished else len(self._encoded) // 4 * 4
+        if length and (self.finished or length >= self._DECODE_BATCH):
+            encoded = bytes(self._encoded[:length])
+            del self._encoded[:length]
+            if self.workers is not None:
+                decoded = await self.workers.run(_decode_base64, encoded)
+            else:
+                decoded = await asyncio.to_thread(_decode_base64, encoded)
+            await self.upload.write(decoded)
+
+        if self.finished:
+            await self.upload.close()
+            self._closed = True
+
+    async def discard(self):
+        if self._opened:
+            await self.upload.discard()
+
+
+class JsonImageUpload:
+    """
+    Handler de IncrementalJsonParser para subidas JSON con imágenes en base64
+    Cada string en una ruta de imagen (is_image_path) se decodifica por partes a su propio archivo
+    temporal; los escalares de value_paths se guardan en values y el resto del documento se salta
+    El base64 se decodifica en workers (el pool de image_workers) si se pasa
+    """
+
+    def __init__(
+        self, staging_dir: str, max_bytes: int, is_image_path, value_paths=(), max_images: int = 1, workers=None
+    ):
+        self.staging_dir = staging_dir
+        self.max_bytes = max_bytes
+        self.is_image_path = is_image_path
+        self.value_paths = set(value_paths)
+        self.max_images = max_images
+        self.workers = workers
+        self.images = []  # Base64UploadSink, en el orden del documento
+        self.values = {}
+
+    def string_sink(self, path):
+        if not self.is_image_path(path):
+            return None
+        if len(self.images) >= self.max_images:
+            raise UploadTooLarge(f"Too many images in one request (max {self.max_images})")
+        sink = Base64UploadSink(StreamingImageUpload(self.staging_dir, self.max_bytes), self.workers)
+        self.images.append(sink)
+        return sink
+
+    def wants_value(self, path):
+        return path in self.value_paths
+
+    def value(self, path, value):
+        self.values[path] = value
+
+    async def flush(self):
+        for sink in self.images:
+            await sink.flush()
+
+    async def discard(self):
+        for sink in self.images:
+            await sink.discard()
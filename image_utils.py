@@ -0,0 +1,164 @@
+"""
+Utilidades para trabajar con los bytes de las imágenes
+"""
+import base64
+import binascii
+import hashlib
+import struct
+
+# Firmas (magic bytes) de los formatos que aceptamos
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def detect_mime_type(data: bytes):
+    """Detectar el tipo MIME de una imagen a partir de sus primeros bytes (None si no se reconoce)"""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+# Marcadores JPEG "Start Of Frame" (traen el tamaño de la imagen)
+_JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+
+
+def _jpeg_dimensions(data: bytes):
+    pos = 2
+    while pos + 1 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        # Saltar bytes de relleno 0xFF
+        while pos < len(data) and data[pos] == 0xFF:
+            pos += 1
+        if pos >= len(data):
+            return None
+        marker = data[pos]
+        pos += 1
+
+        # Marcadores sin segmento de datos
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        if pos + 2 > len(data):
+            return None
+        (length,) = struct.unpack(">H", data[pos:pos + 2])
+
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 7 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 3:pos + 7])
+            return width, height
+        pos += length
+    return None
+
+
+def _webp_dimensions(data: bytes):
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30 and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25 and data[20] == 0x2F:
+        (bits,) = struct.unpack("<I", data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def get_image_dimensions(data: bytes, mime_type: str = None):
+    """Obtener (ancho, alto) leyendo solo los headers del formato. None si no se pueden leer"""
+    mime_type = mime_type or detect_mime_type(data)
+    if mime_type == "image/png" and len(data) >= 24 and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if mime_type == "image/gif" and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if mime_type == "image/jpeg":
+        return _jpeg_dimensions(data)
+    if mime_type == "image/webp":
+        return _webp_dimensions(data)
+    return None
+
+
+def compute_digest(data: bytes) -> str:
+    """SHA-256 en hexadecimal de los bytes de una imagen"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def decode_base64_image(image_data: str) -> bytes:
+    """Decodificar una imagen en base64. Lanza ValueError si el formato no es válido o es demasiado pequeña"""
+    if not image_data or not image_data.strip():
+        raise ValueError("image data cannot be empty")
+
+    try:
+        decoded_data = base64.b64decode(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 format: {str(e)}")
+
+    if len(decoded_data) < 10:
+        raise ValueError("Image data too small")
+    return decoded_data
+
+
+def decode_and_validate_image(image_data: str) -> dict:
+    """
+    Decodificar una imagen en base64 y verificar que sea realmente una imagen (JPEG, PNG, WebP o GIF)
+    Pensada para ejecutarse en el pool de workers. Retorna {"data", "mime_type", "width", "height"}
+    Lanza ValueError si no es válida
+    """
+    decoded_data = decode_base64_image(image_data)
+
+    mime_type = detect_mime_type(decoded_data)
+    if not mime_type:
+        raise ValueError("Unsupported image format (expected JPEG, PNG, WebP or GIF)")
+
+    dimensions = get_image_dimensions(decoded_data, mime_type)
+    if not dimensions or not all(dimensions):
+        raise ValueError("Corrupted image: could not read its dimensions")
+
+    return {
+        "data": decoded_data,
+        "mime_type": mime_type,
+        "width": dimensions[0],
+        "height": dimensions[1],
+    }
+
+
+def validate_image_file(path: str, probe_size: int = 64 * 1024) -> dict:
+    """
+    Verificar que un archivo ya decodificado sea una imagen (JPEG, PNG, WebP o GIF) leyendo solo
+    su comienzo: se lee de a partes cada vez más grandes hasta encontrar las dimensiones
+    Pensada para el pool de workers. Retorna {"mime_type", "width", "height"}; lanza ValueError si no es válida
+    """
+    with open(path, "rb") as file:
+        head = file.read(probe_size)
+        if len(head) < 10:
+            raise ValueError("Image data too small")
+
+        mime_type = detect_mime_type(head)
+        if not mime_type:
+            raise ValueError("Unsupported image format (expected JPEG, PNG, WebP or GIF)")
+
+        dimensions = get_image_dimensions(head, mime_type)
+        while not dimensions:
+            more = file.read(len(head))
+            if not more:
+                break
+            head += more
+            dimensions = get_image_dimensions(head, mime_type)
+
+    if not dimensions or not all(dimensions):
+        raise ValueError("Corrupted image: could not read its dimensions")
+
+    return {"mime_type": mime_type, "width": dimensions[0], "height": dimensions[1]}
@@ -0,0 +1,166 @@
+"""
+Variantes de imágenes (miniaturas, WebP) generadas bajo demanda
+Se renderizan en el pool de workers, se guardan en un caché en disco con un presupuesto de bytes
+(se descartan las menos usadas) y los requests simultáneos de la misma variante esperan un solo render
+"""
+import asyncio
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+# Formatos de salida soportados: nombre en la URL -> (formato de Pillow, mime type, extensión)
+VARIANT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "jpg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+
+# Formato de salida cuando no se pide uno (GIF se convierte a PNG: solo se usa el primer cuadro)
+_DEFAULT_FORMAT_BY_MIME = {
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "png",
+}
+
+
+def variant_format(requested: str, source_mime: str) -> str:
+    """Normalizar el formato pedido. Lanza ValueError si no está soportado"""
+    if requested:
+        name = requested.lower()
+        if name not in VARIANT_FORMATS:
+            raise ValueError(f"Unsupported format: {requested} (expected jpeg, png or webp)")
+        return "jpeg" if name == "jpg" else name
+    return _DEFAULT_FORMAT_BY_MIME.get(source_mime, "jpeg")
+
+
+def variant_media_type(format_name: str) -> str:
+    return VARIANT_FORMATS[format_name][1]
+
+
+def variant_key(digest: str, width: int, height: int, format_name: str) -> str:
+    """Nombre de la variante; depende solo del contenido, así nunca hay que invalidarla"""
+    return f"{digest}_{width or 0}x{height or 0}.{VARIANT_FORMATS[format_name][2]}"
+
+
+def render_variant(source, width: int, height: int, format_name: str, quality: int = 80) -> bytes:
+    """
+    Redimensionar (sin agrandar, manteniendo la proporción) y re-codificar una imagen
+    source: ruta del archivo o bytes. Pensada para ejecutarse en el pool de workers
+    """
+    pil_format = VARIANT_FORMATS[format_name][0]
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        if width or height:
+            image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        output = io.BytesIO()
+        options = {"optimize": True} if pil_format == "PNG" else {"quality": quality}
+        image.save(output, pil_format, **options)
+        return output.getvalue()
+
+
+class VariantCache:
+    """
+    Caché en disco de variantes con un máximo de bytes y expulsión LRU
+    El orden de uso se lleva en memoria; al arrancar se reconstruye con la fecha de modificación
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # nombre -> tamaño, del menos al más usado
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.root, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def read(self, key: str):
+        """
+        Bytes de la variante si está en el caché (y marcarla como usada), None si no
+        Se lee completa: si otra la descarta justo después, lo ya leído sigue sirviendo
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            # Descartada entre la búsqueda y la lectura: se vuelve a renderizar
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        """Guardar una variante y descartar las menos usadas si se supera el máximo. Retorna su ruta"""
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: str = None):
+        # keep (la variante recién guardada) nunca se descarta, aunque sola supere el máximo
+        for name in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            size = self._entries.pop(name)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._entries), "size_bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+
+class SingleFlight:
+    """Agrupa los pedidos simultáneos de la misma clave en una sola ejecución"""
+
+    def __init__(self):
+        self._in_progress = {}
+
+    async def run(self, key: str, factory):
+        """Ejecutar factory() (una corrutina) o esperar la que ya está en curso para esa clave"""
+        future = self._in_progress.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        # shield: si el request que la inició se cancela, los demás siguen esperando el mismo render
+        future = asyncio.ensure_future(factory())
+        self._in_progress[key] = future
+        future.add_done_callback(lambda _: self._in_progress.pop(key, None))
+        return await asyncio.shield(future)
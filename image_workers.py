@@ -0,0 +1,76 @@
+"""
+Pool de workers para el trabajo de CPU con imágenes (decodificar base64, validar, redimensionar)
+Saca ese trabajo del event loop y limita cuántas tareas pueden estar esperando: si la cola
+está llena se rechaza enseguida (503) en lugar de acumular requests en memoria
+"""
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class WorkerPoolBusy(Exception):
+    """No hay lugar en la cola del pool de workers"""
+
+
+class BoundedWorkerPool:
+    """
+    Executor de hilos o de procesos con una cola acotada
+    En modo "process" las funciones y sus argumentos tienen que poder serializarse (funciones de módulo)
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: int = 4, max_queue: int = 32, name: str = "image-worker"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool mode: {mode}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.name = name
+        self._executor = None
+        self._in_flight = 0
+
+    def _get_executor(self):
+        # Se crea al primer uso, así importar el módulo no lanza procesos
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    @property
+    def capacity(self) -> int:
+        """Tareas que se pueden aceptar a la vez (ejecutándose + en cola)"""
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def request_limit(self) -> asyncio.Semaphore:
+        """
+        Semáforo para las tareas de un mismo request (lotes): a lo sumo max_workers a la vez
+        Así un lote más grande que capacity no se rechaza con el pool libre, y un solo request
+        no ocupa toda la cola; WorkerPoolBusy queda para cuando el pool está lleno de verdad
+        """
+        return asyncio.Semaphore(self.max_workers)
+
+    async def run(self, func, *args, **kwargs):
+        """Ejecutar func en el pool. Lanza WorkerPoolBusy si la cola está llena"""
+        if self._in_flight >= self.capacity:
+            raise WorkerPoolBusy(f"{self.name} queue is full")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
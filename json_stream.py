@@ -0,0 +1,295 @@
+"""
+Parser JSON incremental (push) para cuerpos grandes
+Recibe el documento por partes con feed() y, según lo que pida el handler, para cada valor:
+- lo pasa por partes a un "sink" sin armarlo en memoria (strings enormes, p. ej. una imagen en base64)
+- lo arma completo (escalares chicos: style, user_id, ...)
+- o lo salta sin construirlo
+La memoria usada no depende del tamaño del documento sino de las partes y los valores pedidos
+"""
+import json
+import re
+
+_WHITESPACE = b" \t\r\n"
+_LITERAL_CHARS = frozenset(b"+-0123456789.eEtruefalsn")
+_HEX_DIGITS = frozenset(b"0123456789abcdefABCDEF")
+
+# JSON no permite caracteres de control sin escapar dentro de un string
+_CONTROL_CHARS = re.compile(rb"[\x00-\x1f]")
+
+# Escapes que pueden aparecer dentro de un string que se pasa a un sink
+_SIMPLE_ESCAPES = {
+    ord('"'): b'"', ord("\\"): b"\\", ord("/"): b"/", ord("b"): b"\b",
+    ord("f"): b"\f", ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t",
+}
+
+
+class JsonStreamError(ValueError):
+    """El cuerpo no es un JSON válido (o supera los límites del parser)"""
+
+
+class IncrementalJsonParser:
+    """
+    handler debe implementar:
+    - string_sink(path): objeto con write(bytes) y close() para recibir un string por partes, o None
+    - wants_value(path): True si hay que armar el valor escalar de path y pasarlo a value()
+    - value(path, value)
+    path es una tupla de claves e índices, p. ej. ("contents", 0, "parts", 1, "inlineData", "data")
+    """
+
+    def __init__(self, handler, max_value_bytes: int = 64 * 1024, max_depth: int = 64):
+        self.handler = handler
+        self.max_value_bytes = max_value_bytes
+        self.max_depth = max_depth
+        self._stack = []  # [tipo ("map" | "list"), clave o índice actual]
+        self._state = "value"
+        self._pending = b""  # escape incompleto al final de la parte anterior
+
+        # String en curso: para una clave, un valor armado, un sink o para saltar
+        self._in_string = False
+        self._string_kind = None  # "key" | "collect" | "sink" | "skip"
+        self._string_buffer = None
+        self._sink = None
+        self._surrogate = None  # mitad alta de un par \uD83D\uDE00 dentro de un sink
+        self._path = None
+
+        # Número / true / false / null en curso
+        self._literal = None
+
+    def feed(self, data: bytes):
+        if self._pending:
+            data = self._pending + data
+            self._pending = b""
+
+        i, n = 0, len(data)
+        while i < n:
+            if self._in_string:
+                i = self._scan_string(data, i)
+                continue
+
+            if self._literal is not None:
+                start = i
+                while i < n and data[i] in _LITERAL_CHARS:
+                    i += 1
+                self._append_limited(self._literal, data[start:i])
+                if i == n:
+                    break
+                self._finish_literal()
+                continue
+
+            c = data[i]
+            if c in _WHITESPACE:
+                i += 1
+                continue
+            self._structural(c)
+            i += 1
+
+    def close(self):
+        """Verificar que el documento haya terminado"""
+        if self._literal is not None and not self._stack:
+            self._finish_literal()
+        if self._state != "done" or self._in_string or self._pending:
+            raise JsonStreamError("Incomplete JSON document")
+
+    # Estructura
+
+    def _current_path(self):
+        return tuple(entry[1] for entry in self._stack)
+
+    def _structural(self, c: int):
+        state = self._state
+
+        if state == "done":
+            raise JsonStreamError("Unexpected data after the JSON document")
+
+        if state == "value_or_end":
+            if c == ord("]"):
+                self._close_container("list")
+                return
+            state = self._state = "value"
+
+        if state == "value":
+            self._start_value(c)
+        elif state in ("key_or_end", "key"):
+            if c == ord("}") and state == "key_or_end":
+                self._close_container("map")
+            elif c == ord('"'):
+                self._start_string("key")
+            else:
+                raise JsonStreamError("Expected an object key")
+        elif state == "colon":
+            if c != ord(":"):
+                raise JsonStreamError("Expected ':'")
+            self._state = "value"
+        elif state == "comma_or_end":
+            kind = self._stack[-1][0]
+            if c == ord(","):
+                if kind == "map":
+                    self._state = "key"
+                else:
+                    self._stack[-1][1] += 1
+                    self._state = "value"
+            elif c == ord("}") and kind == "map":
+                self._close_container("map")
+            elif c == ord("]") and kind == "list":
+                self._close_container("list")
+            else:
+                raise JsonStreamError("Expected ',' or the end of the container")
+
+    def _start_value(self, c: int):
+        if c == ord("{") or c == ord("["):
+            if len(self._stack) >= self.max_depth:
+                raise JsonStreamError("JSON document is nested too deeply")
+            if c == ord("{"):
+                self._stack.append(["map", None])
+                self._state = "key_or_end"
+            else:
+                self._stack.append(["list", 0])
+                self._state = "value_or_end"
+        elif c == ord('"'):
+            path = self._current_path()
+            sink = self.handler.string_sink(path)
+            if sink is not None:
+                self._sink = sink
+                self._start_string("sink", path)
+            elif self.handler.wants_value(path):
+                self._start_string("collect", path)
+            else:
+                self._start_string("skip", path)
+        elif c in _LITERAL_CHARS:
+            self._literal = bytearray([c])
+        else:
+            raise JsonStreamError(f"Unexpected character {chr(c)!r}")
+
+    def _close_container(self, kind: str):
+        if not self._stack or self._stack[-1][0] != kind:
+            raise JsonStreamError("Mismatched brackets")
+        self._stack.pop()
+        self._end_value()
+
+    def _end_value(self):
+        self._state = "comma_or_end" if self._stack else "done"
+
+    def _finish_literal(self):
+        raw = bytes(self._literal)
+        self._literal = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            raise JsonStreamError(f"Invalid literal {raw[:20]!r}")
+        path = self._current_path()
+        if self.handler.wants_value(path):
+            self.handler.value(path, value)
+        self._end_value()
+
+    # Strings
+
+    def _start_string(self, kind: str, path=None):
+        self._in_string = True
+        self._string_kind = kind
+        self._path = path
+        self._string_buffer = bytearray() if kind in ("key", "collect") else None
+
+    def _append_limited(self, buffer: bytearray, data: bytes):
+        if len(buffer) + len(data) > self.max_value_bytes:
+            raise JsonStreamError(f"JSON value exceeds {self.max_value_bytes} bytes")
+        buffer += data
+
+    def _emit(self, data: bytes):
+        if not data:
+            return
+        if self._string_kind in ("sink", "skip") and _CONTROL_CHARS.search(data):
+            # Los strings armados los valida json.loads al terminar
+            raise JsonStreamError("Invalid control character in string")
+        if self._string_kind == "sink":
+            self._flush_surrogate()
+            self._sink.write(data)
+        elif self._string_kind != "skip":
+            self._append_limited(self._string_buffer, data)
+
+    def _scan_string(self, data: bytes, i: int) -> int:
+        """Consumir el string en curso desde i. Retorna la posición siguiente"""
+        n = len(data)
+        quote = data.find(b'"', i)
+        end = quote if quote != -1 else n
+
+        while True:
+            backslash = data.find(b"\\", i, end)
+            if backslash == -1:
+                break
+            self._emit(data[i:backslash])
+
+            # Escape: \x o \uXXXX (si está cortado se guarda para la próxima parte)
+            length = 6 if backslash + 1 < n and data[backslash + 1] == ord("u") else 2
+            if backslash + length > n:
+                self._pending = data[backslash:]
+                return n
+            self._emit_escape(data[backslash:backslash + length])
+            i = backslash + length
+
+            if i > end:
+                # Era una comilla escapada (\"): buscar la comilla que cierra el string
+                quote = data.find(b'"', i)
+                end = quote if quote != -1 else n
+
+        self._emit(data[i:end])
+        if quote == -1:
+            return n
+
+        self._finish_string()
+        return quote + 1
+
+    def _emit_escape(self, raw: bytes):
+        if self._string_kind in ("key", "collect"):
+            # Se deja tal cual: json.loads lo interpreta al terminar el string
+            self._append_limited(self._string_buffer, raw)
+        elif raw[1] != ord("u") and raw[1] not in _SIMPLE_ESCAPES:
+            raise JsonStreamError("Invalid escape sequence")
+        elif raw[1] == ord("u") and not all(c in _HEX_DIGITS for c in raw[2:]):
+            raise JsonStreamError("Invalid unicode escape")
+        elif self._string_kind == "sink":
+            if raw[1] == ord("u"):
+                code = int(raw[2:], 16)
+                if 0xDC00 <= code < 0xE000 and self._surrogate is not None:
+                    code = 0x10000 + ((self._surrogate - 0xD800) << 10) + (code - 0xDC00)
+                    self._surrogate = None
+                self._flush_surrogate()
+                if 0xD800 <= code < 0xDC00:
+                    self._surrogate = code
+                else:
+                    self._sink.write(chr(code).encode("utf-8", "surrogatepass"))
+            else:
+                self._flush_surrogate()
+                self._sink.write(_SIMPLE_ESCAPES[raw[1]])
+
+    def _flush_surrogate(self):
+        if self._surrogate is not None:
+            self._sink.write(chr(self._surrogate).encode("utf-8", "surrogatepass"))
+            self._surrogate = None
+
+    def _finish_string(self):
+        kind = self._string_kind
+        self._in_string = False
+        self._string_kind = None
+
+        if kind == "sink":
+            self._flush_surrogate()
+            sink, self._sink = self._sink, None
+            sink.close()
+            self._end_value()
+            return
+        if kind == "skip":
+            self._end_value()
+            return
+
+        try:
+            text = json.loads(b'"' + bytes(self._string_buffer) + b'"')
+        except ValueError:
+            raise JsonStreamError("Invalid string")
+        self._string_buffer = None
+
+        if kind == "key":
+            self._stack[-1][1] = text
+            self._state = "colon"
+        else:
+            self.handler.value(self._path, text)
+            self._end_value()
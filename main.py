@@ -1,25 +1,129 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import base64
-import binascii
-from database_simple import (
+from pydantic import BaseModel, ValidationError
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import json
+import os
+import anyio
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from db_async import (
     insert_image,
+    insert_images,
+    insert_image_file,
+    insert_image_files,
     insert_user,
     get_image,
+    get_image_content,
     get_user,
     get_all_images,
     get_all_users,
-    insert_leaderboard_entry,
+    insert_leaderboard_entries,
     get_leaderboard,
     reset_database,
     clear_all_data,
     get_database_stats,
+    clear_table,
+    migrate_images_chunk,
 )
 from config import config
+from pagination import encode_cursor, decode_cursor
+from image_utils import compute_digest, decode_and_validate_image, validate_image_file
+from image_workers import BoundedWorkerPool, WorkerPoolBusy
+from image_variants import (
+    SingleFlight,
+    VariantCache,
+    render_variant,
+    variant_format,
+    variant_key,
+    variant_media_type,
+)
+from PIL import UnidentifiedImageError
+from image_upload import JsonImageUpload, StreamingImageUpload, UploadTooLarge
+from json_stream import IncrementalJsonParser, JsonStreamError
+from database_simple import image_storage
+from http_cache import immutable_response, versioned_url
+from realtime import Broadcaster, ChangeFeed, LeaderboardFeeds
+from realtime_backends import create_backend
+
+
+async def migrate_images_in_background():
+    """
+    Migrar las imágenes base64 antiguas a BLOB por bloques mientras el servidor atiende requests
+    Cada bloque es una transacción corta en el hilo escritor, intercalada con las demás escrituras
+    """
+    last_id = 0
+    try:
+        while True:
+            result = await migrate_images_chunk(last_id, config.IMAGE_MIGRATION_CHUNK_SIZE)
+            if result is None:
+                break
+            _, last_id = result
+            await asyncio.sleep(0)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # No se corta el servidor: las filas que quedan se migran en el próximo arranque
+        print(f"Error migrating images to BLOB (after id {last_id}): {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migration_task = asyncio.create_task(migrate_images_in_background())
+    broadcaster.backend.start(asyncio.get_running_loop())
+    yield
+    migration_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await migration_task
+    image_workers.shutdown()
+    broadcaster.backend.stop()
+
+
+app = FastAPI(title="Image & User API", version="1.0.0", lifespan=lifespan)
+
+# Pool para decodificar y validar imágenes fuera del event loop
+image_workers = BoundedWorkerPool(
+    mode=config.IMAGE_WORKER_MODE,
+    max_workers=config.IMAGE_WORKERS,
+    max_queue=config.IMAGE_WORKER_QUEUE,
+)
 
-app = FastAPI(title="Image & User API", version="1.0.0")
+# Variantes (miniaturas, WebP) ya renderizadas y renders en curso
+variant_cache = VariantCache(config.IMAGE_VARIANT_CACHE_DIR, config.IMAGE_VARIANT_CACHE_MAX_BYTES)
+variant_renders = SingleFlight()
+
+# Canales de notificaciones en tiempo real para los dashboards
+# (con varios workers: REALTIME_BACKEND=sqlite para que los mensajes lleguen a todos)
+broadcaster = Broadcaster(
+    config.REALTIME_QUEUE_SIZE,
+    batch_window=config.REALTIME_BATCH_WINDOW_MS / 1000,
+    backend=create_backend(
+        config.REALTIME_BACKEND,
+        outbox_path=config.REALTIME_OUTBOX_PATH,
+        poll_interval=config.REALTIME_POLL_INTERVAL_MS / 1000,
+        replay_rows=config.REALTIME_REPLAY_BUFFER,
+        max_pending=config.REALTIME_OUTBOX_QUEUE_SIZE,
+    ),
+)
+
+
+async def load_leaderboard_top(game: str, limit: int) -> list:
+    return (await get_leaderboard(game=game, limit=limit))["entries"]
+
+
+# Top N en vivo por juego para /ws/cocteles/{game}
+leaderboard_feeds = LeaderboardFeeds(broadcaster, load_leaderboard_top, config.LEADERBOARD_LIVE_TOP_N)
+
+# Inserciones numeradas para /events (SSE), con los últimos eventos guardados para reanudar
+change_feed = ChangeFeed(broadcaster, config.REALTIME_REPLAY_BUFFER)
+
+
+def publish_image_created(image_id: int, mime_type: str, size_bytes: int, metadata: dict = None):
+    change_feed.publish(
+        "images", {"id": image_id, "mime_type": mime_type, "size_bytes": size_bytes, **(metadata or {})}
+    )
 
 def process_template(template_path: str, request: Request, replacements: dict = None) -> str:
     """
@@ -38,6 +142,8 @@ def process_template(template_path: str, request: Request, replacements: dict =
         'this.apiUrl = "http://localhost:8000/images";': f'this.apiUrl = "{config.get_images_endpoint(request)}";',
         '"http://localhost:8000/images/save"': f'"{base_url}/images/save"',
         '"http://127.0.0.1:8000/images/save"': f'"{base_url}/images/save"',
+        '"http://localhost:8000/images/feed"': f'"{base_url}/images/feed"',
+        'const API_BASE = "http://localhost:8000";': f'const API_BASE = "{base_url}";',
     }
     
     # Agregar reemplazos personalizados si se proporcionan
@@ -83,6 +189,136 @@ class CoctelesData(BaseModel):
     leaderboard: list[LeaderboardEntry]
 
 
+def parse_cursor(after: str, size: int):
+    """Decodificar el parámetro ?after= o responder 400 si no es un cursor válido"""
+    if not after:
+        return None
+    try:
+        return decode_cursor(after, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_pagination(result: dict, after: str = None) -> dict:
+    """Armar el bloque pagination de las respuestas de listado (modo offset o cursor)"""
+    return {
+        "total": result["total"],
+        "limit": result["limit"],
+        "offset": None if after else result["offset"],
+        "after": after,
+        "has_more": result["has_more"],
+        "next_cursor": encode_cursor(result["next_after"]),
+    }
+
+
+def parse_time_filter(value: str, name: str):
+    """
+    Convertir un filtro de fecha ISO 8601 ("2025-10-30", "2025-10-30T10:00:00Z", ...)
+    al formato de created_at ("YYYY-MM-DD HH:MM:SS" en UTC). Lanza 400 si no es válido
+    """
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO 8601 date")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def image_metadata(image: dict, data: dict = None) -> dict:
+    """Metadatos a guardar con una imagen: dimensiones detectadas + style/user_id/timestamp del request"""
+    data = data or {}
+    return {
+        "style": data.get("style") or None,
+        "user_id": data.get("user_id") or None,
+        "timestamp": data.get("timestamp"),
+        "width": image["width"],
+        "height": image["height"],
+    }
+
+
+def workers_busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Image workers are busy, try again later",
+        headers={"Retry-After": str(config.IMAGE_WORKER_RETRY_AFTER)},
+    )
+
+
+async def decode_image(image_data: str) -> dict:
+    """
+    Decodificar y validar una imagen base64 en el pool de workers
+    400 si no es una imagen válida, 503 con Retry-After si la cola está llena
+    """
+    try:
+        return await image_workers.run(decode_and_validate_image, image_data)
+    except WorkerPoolBusy:
+        raise workers_busy_error()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def read_json_images(request: Request, is_image_path, value_paths=(), max_images: int = 1) -> JsonImageUpload:
+    """
+    Leer un cuerpo JSON por partes sin armarlo en memoria: los strings base64 en rutas de imagen
+    se decodifican directo a archivos temporales, se guardan los escalares de value_paths y el resto se salta
+    400 si el JSON o el base64 no son válidos, 413 si una imagen supera IMAGE_MAX_UPLOAD_BYTES,
+    503 con Retry-After si la cola del pool de workers (donde se decodifica el base64) está llena
+    """
+    handler = JsonImageUpload(
+        image_storage.staging_dir(),
+        config.IMAGE_MAX_UPLOAD_BYTES,
+        is_image_path,
+        value_paths,
+        max_images,
+        workers=image_workers,
+    )
+    parser = IncrementalJsonParser(handler)
+    try:
+        async for chunk in request.stream():
+            parser.feed(chunk)
+            await handler.flush()
+        parser.close()
+        await handler.flush()
+    except UploadTooLarge as e:
+        await handler.discard()
+        raise HTTPException(status_code=413, detail=str(e))
+    except WorkerPoolBusy:
+        await handler.discard()
+        raise workers_busy_error()
+    except JsonStreamError as e:
+        await handler.discard()
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    except ValueError as e:
+        await handler.discard()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await handler.discard()
+        raise
+
+    return handler
+
+
+async def validate_json_images(handler: JsonImageUpload) -> list:
+    """
+    Validar en el pool de workers las imágenes ya decodificadas a disco (solo se lee su comienzo)
+    De a max_workers por request, así muchas partes no llenan el pool solas (ver request_limit)
+    Retorna un resultado o la excepción por imagen, en orden; 503 con Retry-After si la cola está llena
+    """
+    limit = image_workers.request_limit()
+
+    async def validate(sink):
+        async with limit:
+            return await image_workers.run(validate_image_file, sink.upload.path)
+
+    results = await asyncio.gather(*(validate(sink) for sink in handler.images), return_exceptions=True)
+    if any(isinstance(result, WorkerPoolBusy) for result in results):
+        raise workers_busy_error()
+    return results
+
+
 @app.post("/images/")
 async def upload_image(image: ImageCreate):
     """
@@ -93,24 +329,49 @@ async def upload_image(image: ImageCreate):
     if not image.image_data or not image.image_data.strip():
         raise HTTPException(status_code=400, detail="image_data cannot be empty")
 
-    try:
-        # Validar que sea base64 válido
-        decoded_data = base64.b64decode(image.image_data)
-
-        # Verificar que tenga un tamaño mínimo razonable
-        if len(decoded_data) < 10:
-            raise HTTPException(status_code=400, detail="Image data too small")
-
-    except (binascii.Error, ValueError) as e:
-        raise HTTPException(status_code=400, detail=f"Invalid base64 format: {str(e)}")
+    image = await decode_image(image.image_data)
 
     # Guardar imagen en la base de datos
-    image_id = insert_image(image.image_data)
+    image_id = await insert_image(image["data"], image["mime_type"], image_metadata(image))
+    publish_image_created(image_id, image["mime_type"], len(image["data"]), image_metadata(image))
 
     return {
         "id": image_id,
         "message": "Image uploaded successfully",
-        "size_bytes": len(decoded_data),
+        "mime_type": image["mime_type"],
+        "size_bytes": len(image["data"]),
+        "width": image["width"],
+        "height": image["height"],
+    }
+
+
+def validate_user_fields(user: UserCreate):
+    """Validaciones de un usuario nuevo (POST /users/ y /ws/users). Lanza HTTPException 400"""
+    if not user.username or not user.username.strip():
+        raise HTTPException(status_code=400, detail="username cannot be empty")
+
+    if not user.email or not user.email.strip():
+        raise HTTPException(status_code=400, detail="email cannot be empty")
+
+    if not user.time or not user.time.strip():
+        raise HTTPException(status_code=400, detail="time cannot be empty")
+
+
+async def save_user(user: UserCreate, exclude=None) -> int:
+    """Guardar un usuario y enviarlo a los dashboards suscritos a "users" (menos exclude)"""
+    user_id = await insert_user(user.username, user.email, user.time)
+    row = {"id": user_id, "username": user.username, "email": user.email, "time": user.time}
+    broadcaster.publish("users", {"type": "user_created", "data": row}, exclude=exclude)
+    change_feed.publish("users", row)
+    return user_id
+
+
+def user_created_response(user_id: int, user: UserCreate) -> dict:
+    return {
+        "status": "success",
+        "message": "User created successfully",
+        "user_id": user_id,
+        "data": {"username": user.username, "email": user.email, "time": user.time},
     }
 
 
@@ -119,42 +380,243 @@ async def create_user(user: UserCreate):
     """
     Endpoint POST para crear y guardar datos de usuario
     Formato esperado: {"username": "...", "email": "...", "time": "..."}
+    El usuario nuevo se envía a las conexiones de /ws/users
     """
+    # Validar que los campos no estén vacíos
+    validate_user_fields(user)
+
     try:
-        # Validar que los campos no estén vacíos
-        if not user.username or not user.username.strip():
-            raise HTTPException(status_code=400, detail="username cannot be empty")
+        # Guardar usuario en la base de datos
+        user_id = await save_user(user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        if not user.email or not user.email.strip():
-            raise HTTPException(status_code=400, detail="email cannot be empty")
+    # Retornar respuesta exitosa
+    return user_created_response(user_id, user)
 
-        if not user.time or not user.time.strip():
-            raise HTTPException(status_code=400, detail="time cannot be empty")
 
-        # Guardar usuario en la base de datos
-        user_id = insert_user(user.username, user.email, user.time)
+async def serve_subscription(websocket: WebSocket, subscription, on_text=None):
+    """
+    Atender una conexión WebSocket suscrita a un canal hasta que se desconecte:
+    envía lo que llega a la suscripción y pasa cada mensaje de texto del cliente a on_text
+    Si la conexión se queda atrás (cola llena) se cierra con 1013 para que el cliente se reconecte
+    """
+    async def receive():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if on_text and message.get("text") is not None:
+                await on_text(message["text"])
+
+    async def send():
+        while (message := await subscription.get()) is not None:
+            # El texto del lote se codifica una vez y se comparte entre todas las conexiones del canal
+            await websocket.send_text(message.text)
+        await websocket.close(code=1013, reason="Too many pending messages")
+
+    # Cuando termina una de las dos (desconexión o cierre por cola llena) se cancela la otra
+    async with anyio.create_task_group() as task_group:
+        async def run_until_done(func):
+            await func()
+            task_group.cancel_scope.cancel()
+
+        task_group.start_soon(run_until_done, receive)
+        task_group.start_soon(run_until_done, send)
+
+
+@app.websocket("/ws/users")
+async def users_websocket(websocket: WebSocket):
+    """
+    WebSocket de usuarios para los dashboards
+    - Cada usuario nuevo (de este socket o de POST /users/) se envía como
+      {"type": "user_created", "data": {"id", "username", "email", "time"}}
+    - Acepta usuarios en JSON ({"username", "email", "time"}) con las mismas validaciones que POST /users/
+      y responde solo a quien lo envió, con el formato de ese endpoint o {"status": "error", "message": ...}
+    """
+    await websocket.accept()
+
+    with broadcaster.subscribe("users") as subscription:
+        async def on_text(text: str):
+            try:
+                user = UserCreate.model_validate_json(text)
+                validate_user_fields(user)
+                user_id = await save_user(user, exclude=subscription)
+                reply = user_created_response(user_id, user)
+            except ValidationError as e:
+                reply = {
+                    "status": "error",
+                    "message": "Invalid user data",
+                    "errors": e.errors(include_url=False, include_context=False),
+                }
+            except HTTPException as e:
+                reply = {"status": "error", "message": e.detail}
+            except Exception as e:
+                reply = {"status": "error", "message": f"Database error: {str(e)}"}
+            subscription.send(reply)
+
+        await serve_subscription(websocket, subscription, on_text)
+
+
+def parse_variant_dimension(value: int, name: str):
+    if value is None:
+        return None
+    if value < 1 or value > config.IMAGE_VARIANT_MAX_DIMENSION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name} must be between 1 and {config.IMAGE_VARIANT_MAX_DIMENSION}",
+        )
+    return value
 
-        # Retornar respuesta exitosa
-        return {
-            "status": "success",
-            "message": "User created successfully",
-            "user_id": user_id,
-            "data": {"username": user.username, "email": user.email, "time": user.time},
+
+async def render_and_cache_variant(key: str, source, width: int, height: int, format_name: str) -> bytes:
+    """Renderizar una variante en el pool de workers y guardarla en el caché. Retorna sus bytes"""
+    data = await image_workers.run(
+        render_variant, source, width, height, format_name, config.IMAGE_VARIANT_QUALITY
+    )
+    await asyncio.to_thread(variant_cache.put, key, data)
+    return data
+
+
+def image_full_url(images_endpoint: str, image_id: int, digest: str = None) -> str:
+    return versioned_url(f"{images_endpoint}/{image_id}/raw", digest)
+
+
+def image_thumb_url(images_endpoint: str, image_id: int, digest: str = None) -> str:
+    return versioned_url(f"{images_endpoint}/{image_id}?w={config.IMAGE_THUMB_WIDTH}&format=webp", digest)
+
+
+@app.get("/images/feed")
+async def images_feed(
+    request: Request,
+    response: Response,
+    limit: int = config.IMAGE_FEED_PAGE_SIZE,
+    after: str = None,
+    user_id: str = None,
+    style: str = None,
+):
+    """
+    Feed de la galería para scroll infinito: páginas chicas, de la más nueva a la más vieja
+    Cada elemento trae solo {id, thumb_url, full_url, mime_type, width, height}; la página siguiente
+    se pide con after=next_cursor (también va en el header Link rel="next" para prefetch)
+    - limit: imágenes por página (default: IMAGE_FEED_PAGE_SIZE, max: 50)
+    - user_id / style: solo las imágenes de ese usuario / estilo
+    """
+    limit = max(1, min(limit, 50))
+    cursor_values = parse_cursor(after, 2)
+    result = await get_all_images(
+        limit, after=cursor_values, user_id=user_id, style=style, include_total=False
+    )
+
+    images_endpoint = config.get_images_endpoint(request)
+    items = [
+        {
+            "id": image["id"],
+            "thumb_url": image_thumb_url(images_endpoint, image["id"], image["sha256"]),
+            "full_url": image_full_url(images_endpoint, image["id"], image["sha256"]),
+            "mime_type": image["mime_type"],
+            "width": image["width"],
+            "height": image["height"],
         }
+        for image in result["images"]
+    ]
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    next_cursor = encode_cursor(result["next_after"])
+    next_url = None
+    if next_cursor:
+        params = {"limit": limit, "after": next_cursor, "user_id": user_id, "style": style}
+        query = urlencode({key: value for key, value in params.items() if value is not None})
+        next_url = f"{images_endpoint}/feed?{query}"
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return {
+        "success": True,
+        "items": items,
+        "next_cursor": next_cursor,
+        "next_url": next_url,
+    }
 
 
 @app.get("/images/{image_id}")
-async def get_image_by_id(image_id: int):
+async def get_image_by_id(
+    image_id: int, request: Request, w: int = None, h: int = None, format: str = None
+):
     """
     Obtener información de una imagen por ID
+    Con w, h y/o format retorna en cambio los bytes de una variante redimensionada / re-codificada
+    (la imagen entra en w x h sin agrandarse ni deformarse; format: jpeg, png o webp)
+    Las variantes se generan una sola vez y se sirven desde un caché en disco
     """
-    image = get_image(image_id)
-    if not image:
+    if w is None and h is None and format is None:
+        image = await get_image(image_id)
+        if not image:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return image
+
+    width = parse_variant_dimension(w, "w")
+    height = parse_variant_dimension(h, "h")
+
+    content = await get_image_content(image_id)
+    if not content:
         raise HTTPException(status_code=404, detail="Image not found")
-    return image
+    source = content["path"] or content["data"]
+    if source is None:
+        raise HTTPException(status_code=404, detail="Image content not found")
+    if isinstance(source, memoryview) and image_workers.mode == "process":
+        # Slice del mmap de un pack: no se puede enviar a otro proceso
+        source = bytes(source)
+
+    try:
+        format_name = variant_format(format, content["mime_type"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    digest = content["sha256"] or compute_digest(content["data"])
+    key = variant_key(digest, width, height, format_name)
+
+    data = await asyncio.to_thread(variant_cache.read, key)
+    if data is None:
+        try:
+            data = await variant_renders.run(
+                key, lambda: render_and_cache_variant(key, source, width, height, format_name)
+            )
+        except WorkerPoolBusy:
+            raise workers_busy_error()
+        except (UnidentifiedImageError, OSError) as e:
+            raise HTTPException(status_code=422, detail=f"Cannot render image variant: {str(e)}")
+
+    return immutable_response(
+        request, key, variant_media_type(format_name), len(data), data=data, version=digest
+    )
+
+
+@app.api_route("/images/{image_id}/raw", methods=["GET", "HEAD"])
+async def get_image_raw(image_id: int, request: Request):
+    """
+    Obtener los bytes de una imagen con su Content-Type (para usar directamente en <img src>)
+    Si la imagen está en el almacenamiento en disco se sirve desde el archivo
+    ETag = SHA-256, 304 y Range; Cache-Control immutable solo con ?v=<sha256> (los ids se reutilizan)
+    """
+    content = await get_image_content(image_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    media_type = content["mime_type"] or "application/octet-stream"
+    if content["path"]:
+        try:
+            size = os.path.getsize(content["path"])
+        except OSError:
+            raise HTTPException(status_code=404, detail="Image content not found")
+        return immutable_response(
+            request, content["sha256"], media_type, size, path=content["path"]
+        )
+
+    if content["data"] is None:
+        raise HTTPException(status_code=404, detail="Image content not found")
+    digest = content["sha256"] or compute_digest(content["data"])
+    return immutable_response(
+        request, digest, media_type, len(content["data"]), data=content["data"]
+    )
 
 
 @app.get("/users/{user_id}")
@@ -162,18 +624,34 @@ async def get_user_by_id(user_id: int):
     """
     Obtener información de un usuario por ID
     """
-    user = get_user(user_id)
+    user = await get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @app.get("/images/")
-async def list_images(limit: int = 50, offset: int = 0):
+async def list_images(
+    request: Request,
+    limit: int = 50,
+    offset: int = 0,
+    after: str = None,
+    include_data: bool = False,
+    user_id: str = None,
+    style: str = None,
+    created_from: str = None,
+    created_to: str = None,
+):
     """
     Listar todas las imágenes almacenadas con paginación
+    Retorna solo metadatos (id, created_at, mime_type, size_bytes, sha256, style, user_id, timestamp, width, height)
+    la URL de los bytes (/images/{id}/raw?v=<sha256>) y la de su miniatura WebP (thumb_url)
     - limit: número máximo de imágenes a retornar (default: 50, max: 100)
     - offset: número de imágenes a saltar para paginación (default: 0)
+    - after: cursor opaco (pagination.next_cursor de la página anterior); si se envía se ignora offset
+    - include_data: incluir también image_data en base64 (formato anterior, default: false)
+    - user_id / style: solo las imágenes de ese usuario / estilo
+    - created_from / created_to: rango de fechas de subida [desde, hasta) en ISO 8601 (UTC)
     """
     # Validar límites
     if limit > 100:
@@ -183,26 +661,37 @@ async def list_images(limit: int = 50, offset: int = 0):
     if offset < 0:
         offset = 0
 
-    result = get_all_images(limit, offset)
+    cursor_values = parse_cursor(after, 2)
+    result = await get_all_images(
+        limit,
+        offset,
+        after=cursor_values,
+        include_data=include_data,
+        user_id=user_id,
+        style=style,
+        created_from=parse_time_filter(created_from, "created_from"),
+        created_to=parse_time_filter(created_to, "created_to"),
+    )
+
+    images_endpoint = config.get_images_endpoint(request)
+    for image in result["images"]:
+        image["url"] = image_full_url(images_endpoint, image["id"], image["sha256"])
+        image["thumb_url"] = image_thumb_url(images_endpoint, image["id"], image["sha256"])
 
     return {
         "success": True,
         "data": result["images"],
-        "pagination": {
-            "total": result["total"],
-            "limit": result["limit"],
-            "offset": result["offset"],
-            "has_more": (result["offset"] + result["limit"]) < result["total"],
-        },
+        "pagination": build_pagination(result, after),
     }
 
 
 @app.get("/users/")
-async def list_users(limit: int = 50, offset: int = 0):
+async def list_users(limit: int = 50, offset: int = 0, after: str = None):
     """
     Listar todos los usuarios almacenados con paginación
     - limit: número máximo de usuarios a retornar (default: 50, max: 100)
     - offset: número de usuarios a saltar para paginación (default: 0)
+    - after: cursor opaco (pagination.next_cursor de la página anterior); si se envía se ignora offset
     """
     # Validar límites
     if limit > 100:
@@ -212,17 +701,13 @@ async def list_users(limit: int = 50, offset: int = 0):
     if offset < 0:
         offset = 0
 
-    result = get_all_users(limit, offset)
+    cursor_values = parse_cursor(after, 2)
+    result = await get_all_users(limit, offset, after=cursor_values)
 
     return {
         "success": True,
         "data": result["users"],
-        "pagination": {
-            "total": result["total"],
-            "limit": result["limit"],
-            "offset": result["offset"],
-            "has_more": (result["offset"] + result["limit"]) < result["total"],
-        },
+        "pagination": build_pagination(result, after),
     }
 
 
@@ -231,67 +716,92 @@ async def root():
     return {"message": "Image & User API is running"}
 
 
+def is_gemini_inline_data(path: tuple) -> bool:
+    """contents[i].parts[j].inlineData.data"""
+    return (
+        len(path) == 6
+        and path[0] == "contents" and isinstance(path[1], int)
+        and path[2] == "parts" and isinstance(path[3], int)
+        and path[4:] == ("inlineData", "data")
+    )
+
+
 @app.post("/images/gemini")
-async def upload_image_gemini_format(data: dict):
+async def upload_image_gemini_format(request: Request):
     """
     Endpoint para recibir imágenes en formato Gemini API
-    Extrae la imagen del formato complejo y la guarda
+    El cuerpo se lee por partes: cada inlineData.data de contents[].parts[] se decodifica del base64
+    directo a un archivo temporal y el resto del documento se salta. Las imágenes se validan en paralelo
+    en el pool de workers y se guardan en una sola transacción (todas o ninguna)
+    Retorna un id por parte, en el orden en que aparecen; "id" es el de la primera
     """
+    handler = await read_json_images(
+        request, is_gemini_inline_data, max_images=config.IMAGE_BATCH_MAX_ITEMS
+    )
     try:
-        # Extraer la imagen del formato Gemini
-        contents = data.get("contents", [])
-        if not contents:
-            raise HTTPException(status_code=400, detail="No contents found")
-
-        # Buscar la imagen en las partes
-        image_data = None
-        mime_type = None
-
-        for content in contents:
-            parts = content.get("parts", [])
-            for part in parts:
-                if "inlineData" in part:
-                    inline_data = part["inlineData"]
-                    image_data = inline_data.get("data")
-                    mime_type = inline_data.get("mimeType")
-                    break
-            if image_data:
-                break
+        # Las partes con data vacía se ignoran, como antes
+        for sink in [sink for sink in handler.images if sink.upload.size == 0]:
+            await sink.discard()
+            handler.images.remove(sink)
 
-        if not image_data:
+        if not handler.images:
             raise HTTPException(
                 status_code=400, detail="No image data found in request"
             )
 
-        # Validar base64
-        try:
-            decoded_data = base64.b64decode(image_data)
-            if len(decoded_data) < 10:
-                raise HTTPException(status_code=400, detail="Image data too small")
-        except (binascii.Error, ValueError) as e:
-            raise HTTPException(
-                status_code=400, detail=f"Invalid base64 format: {str(e)}"
-            )
+        validated = await validate_json_images(handler)
+        errors = [(index, result) for index, result in enumerate(validated) if isinstance(result, Exception)]
+        if errors:
+            index, error = errors[0]
+            raise HTTPException(status_code=400, detail=f"Invalid image in part {index}: {str(error)}")
+
+        # Guardar todas en la base de datos en una sola transacción
+        uploads = [sink.upload for sink in handler.images]
+        image_ids = await insert_image_files(
+            [
+                (upload.path, upload.digest, upload.size, image["mime_type"], image_metadata(image))
+                for upload, image in zip(uploads, validated)
+            ]
+        )
+    except HTTPException:
+        await handler.discard()
+        raise
+    except Exception as e:
+        await handler.discard()
+        raise HTTPException(
+            status_code=400, detail=f"Error processing Gemini format: {str(e)}"
+        )
 
-        # Guardar en la base de datos
-        image_id = insert_image(image_data)
+    for image_id, upload, image in zip(image_ids, uploads, validated):
+        publish_image_created(image_id, image["mime_type"], upload.size, image_metadata(image))
 
-        return {
+    images = [
+        {
             "id": image_id,
-            "message": "Image uploaded successfully",
-            "mime_type": mime_type,
-            "size_bytes": len(decoded_data),
-            "original_format": "gemini_api",
+            "mime_type": image["mime_type"],
+            "size_bytes": upload.size,
+            "width": image["width"],
+            "height": image["height"],
         }
+        for image_id, upload, image in zip(image_ids, uploads, validated)
+    ]
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, detail=f"Error processing Gemini format: {str(e)}"
-        )
+    return {
+        **images[0],
+        "ids": image_ids,
+        "images": images,
+        "count": len(images),
+        "message": f"{len(images)} image(s) uploaded successfully",
+        "original_format": "gemini_api",
+    }
+
+
+# Campos de /images/save que se leen del cuerpo (image_data_base64 va directo a disco)
+SAVE_FIELDS = ("style", "timestamp", "user_id")
 
 
 @app.post("/images/save")
-async def save_image_custom_format(data: dict):
+async def save_image_custom_format(request: Request):
     """
     Endpoint para el formato específico del frontend
     Formato esperado: {
@@ -301,47 +811,223 @@ async def save_image_custom_format(data: dict):
         "timestamp": ...,
         "user_id": "..."
     }
+    El cuerpo se lee por partes: image_data_base64 se decodifica directo a un archivo temporal
     """
+    handler = await read_json_images(
+        request,
+        lambda path: path == ("image_data_base64",),
+        value_paths=[(field,) for field in SAVE_FIELDS],
+    )
+    data = {path[0]: value for path, value in handler.values.items()}
+    style = data.get("style", "")
+    timestamp = data.get("timestamp")
+    user_id = data.get("user_id", "")
+
     try:
-        # Extraer datos del formato del frontend
-        image_data = data.get("image_data_base64")
-        mime_type = data.get("mime_type", "image/jpeg")
-        style = data.get("style", "")
-        timestamp = data.get("timestamp")
-        user_id = data.get("user_id", "")
-
-        if not image_data:
+        if not handler.images or handler.images[0].upload.size == 0:
             raise HTTPException(status_code=400, detail="image_data_base64 is required")
 
-        # Validar base64
+        upload = handler.images[0].upload
+        (image,) = await validate_json_images(handler)
+        if isinstance(image, Exception):
+            raise HTTPException(status_code=400, detail=str(image))
+
+        # Guardar en la base de datos junto con style, user_id y timestamp
+        image_id = await insert_image_file(
+            upload.path, upload.digest, upload.size, image["mime_type"], image_metadata(image, data)
+        )
+    except HTTPException:
+        await handler.discard()
+        raise
+    except Exception as e:
+        await handler.discard()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    publish_image_created(image_id, image["mime_type"], upload.size, image_metadata(image, data))
+
+    return {
+        "success": True,
+        "id": image_id,
+        "message": "Image saved successfully",
+        "mime_type": image["mime_type"],
+        "size_bytes": upload.size,
+        "width": image["width"],
+        "height": image["height"],
+        "style": style,
+        "timestamp": timestamp,
+        "user_id": user_id,
+    }
+
+
+# Margen para boundaries y headers de las partes en las subidas multipart
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+@app.post("/images/upload")
+async def upload_image_stream(request: Request):
+    """
+    Endpoint para subir una imagen en binario sin cargarla completa en memoria
+    Acepta el cuerpo crudo (Content-Type: image/jpeg, image/png, ...) o multipart/form-data
+    con un archivo. Los bytes se escriben por partes al almacenamiento mientras se calcula su hash
+    Las subidas más grandes que IMAGE_MAX_UPLOAD_BYTES se rechazan con 413 antes de leer el cuerpo
+    El tipo sale de los bytes (JPEG, PNG, WebP o GIF), no del Content-Type: 400 si no es una imagen
+    """
+    max_bytes = config.IMAGE_MAX_UPLOAD_BYTES
+    content_type = request.headers.get("content-type", "")
+    is_multipart = content_type.startswith("multipart/form-data")
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
         try:
-            decoded_data = base64.b64decode(image_data)
-            if len(decoded_data) < 10:
-                raise HTTPException(status_code=400, detail="Image data too small")
-        except (binascii.Error, ValueError) as e:
+            content_length = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        allowed = max_bytes + (MULTIPART_OVERHEAD_BYTES if is_multipart else 0)
+        if content_length > allowed:
             raise HTTPException(
-                status_code=400, detail=f"Invalid base64 format: {str(e)}"
+                status_code=413, detail=f"Upload exceeds the maximum of {max_bytes} bytes"
             )
+    elif is_multipart:
+        # Sin Content-Length no se puede acotar lo que el parser de multipart deja en disco
+        raise HTTPException(status_code=411, detail="Content-Length is required for multipart uploads")
 
-        # Guardar en la base de datos
-        image_id = insert_image(image_data)
-
-        return {
-            "success": True,
-            "id": image_id,
-            "message": "Image saved successfully",
-            "mime_type": mime_type,
-            "size_bytes": len(decoded_data),
-            "style": style,
-            "timestamp": timestamp,
-            "user_id": user_id,
-        }
-
+    upload = await StreamingImageUpload(image_storage.staging_dir(), max_bytes).open()
+    try:
+        if is_multipart:
+            async with request.form(max_files=1, max_fields=10) as form:
+                files = [value for value in form.values() if hasattr(value, "read")]
+                if not files:
+                    raise HTTPException(status_code=400, detail="No file found in multipart body")
+                file = files[0]
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await upload.write(chunk)
+        else:
+            async for chunk in request.stream():
+                await upload.write(chunk)
+
+        await upload.close()
+
+        # Igual que en las demás subidas: firma y dimensiones, leyendo solo el comienzo del archivo
+        try:
+            image = await image_workers.run(validate_image_file, upload.path)
+        except WorkerPoolBusy:
+            raise workers_busy_error()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        mime_type = image["mime_type"]
+
+        image_id = await insert_image_file(
+            upload.path, upload.digest, upload.size, mime_type, image_metadata(image)
+        )
+    except UploadTooLarge as e:
+        await upload.discard()
+        raise HTTPException(status_code=413, detail=str(e))
     except HTTPException:
+        await upload.discard()
         raise
+    except Exception as e:
+        await upload.discard()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    publish_image_created(image_id, mime_type, upload.size, image_metadata(image))
+
+    return {
+        "success": True,
+        "id": image_id,
+        "message": "Image uploaded successfully",
+        "mime_type": mime_type,
+        "size_bytes": upload.size,
+        "width": image["width"],
+        "height": image["height"],
+        "sha256": upload.digest,
+    }
+
+
+@app.post("/images/batch")
+async def save_images_batch(data: dict):
+    """
+    Endpoint para subir varias imágenes en un solo request (ráfagas de las cabinas de fotos)
+    Cada elemento usa los mismos campos que /images/save. Las imágenes se validan en paralelo,
+    las válidas se guardan en una sola transacción y se retorna un resultado por elemento
+    Formato esperado: {
+        "images": [
+            {"image_data_base64": "...", "mime_type": "image/jpeg", "style": "...", "timestamp": ..., "user_id": "..."}
+        ]
+    }
+    """
+    items = data.get("images")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="images must be a non-empty list")
+    if len(items) > config.IMAGE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images in one batch (max {config.IMAGE_BATCH_MAX_ITEMS})",
+        )
+
+    limit = image_workers.request_limit()
+
+    async def validate_item(item):
+        if not isinstance(item, dict):
+            raise ValueError("Each image must be an object")
+        if not item.get("image_data_base64"):
+            raise ValueError("image_data_base64 is required")
+        async with limit:
+            return await image_workers.run(decode_and_validate_image, item["image_data_base64"])
+
+    # Validar (decodificar) las imágenes en paralelo en el pool de workers, de a max_workers por request
+    decoded = await asyncio.gather(
+        *(validate_item(item) for item in items),
+        return_exceptions=True,
+    )
+    if any(isinstance(result, WorkerPoolBusy) for result in decoded):
+        raise workers_busy_error()
+
+    valid_indexes = [i for i, result in enumerate(decoded) if not isinstance(result, Exception)]
+
+    image_ids = []
+    try:
+        if valid_indexes:
+            image_ids = await insert_images(
+                [
+                    (decoded[i]["data"], decoded[i]["mime_type"], image_metadata(decoded[i], items[i]))
+                    for i in valid_indexes
+                ]
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+    ids_by_index = dict(zip(valid_indexes, image_ids))
+    for index, image_id in ids_by_index.items():
+        image = decoded[index]
+        publish_image_created(image_id, image["mime_type"], len(image["data"]), image_metadata(image, items[index]))
+
+    results = []
+    for index, (item, result) in enumerate(zip(items, decoded)):
+        if isinstance(result, Exception):
+            results.append({"index": index, "success": False, "error": str(result)})
+            continue
+        results.append({
+            "index": index,
+            "success": True,
+            "id": ids_by_index[index],
+            "mime_type": result["mime_type"],
+            "size_bytes": len(result["data"]),
+            "width": result["width"],
+            "height": result["height"],
+            "style": item.get("style", ""),
+            "timestamp": item.get("timestamp"),
+            "user_id": item.get("user_id", ""),
+        })
+
+    return {
+        "success": bool(valid_indexes),
+        "message": f"{len(valid_indexes)} of {len(items)} images saved successfully",
+        "saved": len(valid_indexes),
+        "failed": len(items) - len(valid_indexes),
+        "results": results,
+    }
+
 
 @app.post("/images/test")
 async def test_image_endpoint(data: dict):
@@ -363,7 +1049,7 @@ async def get_db_stats():
     Obtener estadísticas de la base de datos
     """
     try:
-        stats = get_database_stats()
+        stats = await get_database_stats()
         return {
             "success": True,
             "message": "Database statistics retrieved successfully",
@@ -381,13 +1067,14 @@ async def reset_db():
     """
     try:
         # Obtener estadísticas antes del reset
-        stats_before = get_database_stats()
+        stats_before = await get_database_stats()
         
         # Resetear la base de datos
-        reset_database()
+        await reset_database()
+        leaderboard_feeds.notify()
         
         # Obtener estadísticas después del reset
-        stats_after = get_database_stats()
+        stats_after = await get_database_stats()
         
         return {
             "success": True,
@@ -408,13 +1095,14 @@ async def clear_db():
     """
     try:
         # Obtener estadísticas antes de limpiar
-        stats_before = get_database_stats()
+        stats_before = await get_database_stats()
         
         # Limpiar todos los datos
-        clear_all_data()
+        await clear_all_data()
+        leaderboard_feeds.notify()
         
         # Obtener estadísticas después de limpiar
-        stats_after = get_database_stats()
+        stats_after = await get_database_stats()
         
         return {
             "success": True,
@@ -433,21 +1121,8 @@ async def clear_images():
     Eliminar todas las imágenes de la base de datos
     """
     try:
-        from database_simple import get_connection
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Contar imágenes antes
-        cursor.execute("SELECT COUNT(*) FROM images")
-        count_before = cursor.fetchone()[0]
-        
-        # Eliminar todas las imágenes
-        cursor.execute("DELETE FROM images")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='images'")
-        
-        conn.commit()
-        conn.close()
+        # Eliminar todos los registros y obtener cuántos había antes
+        count_before = await clear_table("images")
         
         return {
             "success": True,
@@ -464,21 +1139,8 @@ async def clear_users():
     Eliminar todos los usuarios de la base de datos
     """
     try:
-        from database_simple import get_connection
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Contar usuarios antes
-        cursor.execute("SELECT COUNT(*) FROM users")
-        count_before = cursor.fetchone()[0]
-        
-        # Eliminar todos los usuarios
-        cursor.execute("DELETE FROM users")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='users'")
-        
-        conn.commit()
-        conn.close()
+        # Eliminar todos los registros y obtener cuántos había antes
+        count_before = await clear_table("users")
         
         return {
             "success": True,
@@ -510,19 +1172,40 @@ async def receive_cocteles_data(data: CoctelesData):
     }
     """
     try:
+        # Guardar todo el leaderboard en una sola transacción
+        entry_ids = await insert_leaderboard_entries(
+            game=data.game,
+            timestamp=data.timestamp,
+            entries=[
+                {
+                    "position": entry.position,
+                    "name": entry.name,
+                    "score": entry.score,
+                    "date": entry.date,
+                }
+                for entry in data.leaderboard
+            ],
+        )
+
+        for entry_id, entry in zip(entry_ids, data.leaderboard):
+            change_feed.publish("leaderboard", {
+                "id": entry_id,
+                "game": data.game,
+                "position": entry.position,
+                "name": entry.name,
+                "score": entry.score,
+                "date": entry.date,
+                "timestamp": data.timestamp,
+            })
+
+        # Avisar a /ws/cocteles/{game} si cambió el top de ese juego
+        leaderboard_feeds.notify(
+            data.game,
+            [(entry.score, entry.date, entry_id) for entry_id, entry in zip(entry_ids, data.leaderboard)],
+        )
+
         saved_entries = []
-        
-        # Procesar cada entrada del leaderboard
-        for entry in data.leaderboard:
-            entry_id = insert_leaderboard_entry(
-                game=data.game,
-                position=entry.position,
-                name=entry.name,
-                score=entry.score,
-                date=entry.date,
-                timestamp=data.timestamp
-            )
-            
+        for entry_id, entry in zip(entry_ids, data.leaderboard):
             saved_entries.append({
                 "id": entry_id,
                 "position": entry.position,
@@ -543,13 +1226,117 @@ async def receive_cocteles_data(data: CoctelesData):
         raise HTTPException(status_code=500, detail=f"Error saving leaderboard data: {str(e)}")
 
 
+@app.websocket("/ws/cocteles/{game}")
+async def cocteles_websocket(websocket: WebSocket, game: str):
+    """
+    Top N en vivo de un juego
+    - Al conectarse: {"type": "snapshot", "game", "seq", "limit", "entries": [...]}
+    - Cuando un envío a /cocteles cambia el top: {"type": "patch", "game", "seq", "removed", "moved", "inserted"}
+      (ver realtime.ranking_patch); seq aumenta de a uno
+    - Si el cliente detecta un salto en seq envía {"type": "resync"} y recibe un snapshot nuevo
+    """
+    await websocket.accept()
+
+    with broadcaster.subscribe(leaderboard_feeds.channel(game)) as subscription:
+        async def on_text(text: str):
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            if isinstance(message, dict) and message.get("type") == "resync":
+                await leaderboard_feeds.send_snapshot(game, subscription)
+            else:
+                subscription.send({"type": "error", "message": 'Expected {"type": "resync"}'})
+
+        await leaderboard_feeds.send_snapshot(game, subscription)
+        await serve_subscription(websocket, subscription, on_text)
+
+
+# Tablas que se pueden seguir por /events y milisegundos que espera EventSource antes de reconectarse
+EVENT_TABLES = ("users", "images", "leaderboard")
+EVENTS_RETRY_MS = 3000
+
+
+@app.get("/events")
+async def events_stream(request: Request, tables: str = None, game: str = None, last_event_id: str = None):
+    """
+    Server-Sent Events con las inserciones en users, images y leaderboard
+    (para redes o proxies que bloquean WebSocket; se usa con EventSource)
+    - tables: tablas separadas por coma (default: todas)
+    - game: solo las entradas del leaderboard de ese juego
+    - Last-Event-ID (header que EventSource envía al reconectarse, o ?last_event_id=): reanuda después
+      de ese evento con el buffer del servidor. Si ya no se puede se envía un evento "reset" y el cliente
+      debe recargar los datos completos
+    Cada evento: id "<arranque>-<n>", event = nombre de la tabla, data = la fila insertada en JSON
+    """
+    selected = set(EVENT_TABLES) if not tables else {name.strip() for name in tables.split(",") if name.strip()}
+    unknown = selected - set(EVENT_TABLES)
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400, detail=f"tables must be a comma-separated subset of {', '.join(EVENT_TABLES)}"
+        )
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+
+    def wanted(event) -> bool:
+        if event.table not in selected:
+            return False
+        return not (game and event.table == "leaderboard" and event.data["game"] != game)
+
+    def frames(events) -> bytes:
+        # Los frames SSE ya vienen codificados: solo se filtran y se juntan
+        return b"".join(event.frame for event in events if wanted(event))
+
+    async def stream():
+        with broadcaster.subscribe(ChangeFeed.CHANNEL) as subscription:
+            # Sin await entre suscribirse y leer el buffer: no se pierde ningún evento
+            replayed = change_feed.replay(last_event_id) if last_event_id else []
+            # Lo que el cliente ya tiene o ya se le envió no se repite (los lotes en curso pueden incluirlo;
+            # con varios workers el id puede venir de uno más adelantado)
+            if replayed:
+                after = replayed[-1].seq
+            elif replayed is not None and last_event_id:
+                after = change_feed.event_seq(last_event_id)
+            else:
+                after = change_feed.position
+            yield f"retry: {EVENTS_RETRY_MS}\n\n".encode()
+            if replayed is None:
+                yield f"id: {change_feed.last_event_id}\nevent: reset\ndata: {{}}\n\n".encode()
+            elif not last_event_id:
+                # Un id sin data no dispara eventos pero deja la posición para reanudar
+                yield f"id: {change_feed.last_event_id}\n\n".encode()
+
+            if replayed:
+                yield frames(replayed)
+
+            while True:
+                try:
+                    batch = await asyncio.wait_for(subscription.get(), config.SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentario para que los proxies no corten la conexión por inactividad
+                    yield b": keepalive\n\n"
+                    continue
+                if batch is None:
+                    # Cola llena: se corta y el cliente se reconecta con Last-Event-ID
+                    return
+                data = frames(event for event in batch.messages if event.seq > after)
+                if data:
+                    yield data
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/cocteles/leaderboard")
-async def get_cocteles_leaderboard(game: str = None, limit: int = 50, offset: int = 0):
+async def get_cocteles_leaderboard(game: str = None, limit: int = 50, offset: int = 0, after: str = None):
     """
     Obtener datos del leaderboard de cocteles
     - game: filtrar por juego específico (opcional)
     - limit: número máximo de entradas (default: 50, max: 100)
     - offset: número de entradas a saltar (default: 0)
+    - after: cursor opaco (pagination.next_cursor de la página anterior); si se envía se ignora offset
     """
     # Validar límites
     if limit > 100:
@@ -559,18 +1346,15 @@ async def get_cocteles_leaderboard(game: str = None, limit: int = 50, offset: in
     if offset < 0:
         offset = 0
 
+    cursor_values = parse_cursor(after, 3)
+
     try:
-        result = get_leaderboard(game=game, limit=limit, offset=offset)
+        result = await get_leaderboard(game=game, limit=limit, offset=offset, after=cursor_values)
         
         return {
             "success": True,
             "data": result["entries"],
-            "pagination": {
-                "total": result["total"],
-                "limit": result["limit"],
-                "offset": result["offset"],
-                "has_more": (result["offset"] + result["limit"]) < result["total"],
-            },
+            "pagination": build_pagination(result, after),
             "filter": {
                 "game": game if game else "all"
             }
@@ -586,21 +1370,9 @@ async def clear_leaderboard():
     Eliminar todas las entradas del leaderboard
     """
     try:
-        from database_simple import get_connection
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Contar entradas antes
-        cursor.execute("SELECT COUNT(*) FROM leaderboard")
-        count_before = cursor.fetchone()[0]
-        
-        # Eliminar todas las entradas
-        cursor.execute("DELETE FROM leaderboard")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='leaderboard'")
-        
-        conn.commit()
-        conn.close()
+        # Eliminar todos los registros y obtener cuántos había antes
+        count_before = await clear_table("leaderboard")
+        leaderboard_feeds.notify()
         
         return {
             "success": True,
@@ -0,0 +1,30 @@
+"""
+Cursores opacos para la paginación por keyset (?after=...)
+El token es la clave de orden de la última fila vista (p. ej. [created_at, id]) en JSON + base64 url-safe
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values):
+    """Codificar la clave de orden de la última fila como token opaco (None si no hay más páginas)"""
+    if values is None:
+        return None
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> tuple:
+    """Decodificar un token de cursor. Lanza ValueError si no es válido"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor: unexpected shape")
+    if any(isinstance(value, (list, dict)) for value in values):
+        raise ValueError("Invalid cursor: unexpected value")
+    return tuple(values)
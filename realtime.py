@@ -0,0 +1,374 @@
+"""
+Notificaciones en tiempo real para los dashboards (WebSocket y SSE)
+Cada conexión se suscribe a un canal ("users", "cocteles:<juego>", ...) y recibe los mensajes que se publican en él
+Los mensajes se encolan por conexión con un máximo: una conexión que no da abasto se cierra
+(el cliente se reconecta y recarga) en lugar de frenar a las demás o acumular memoria
+Con varios workers los mensajes pasan de un proceso a otro por un backend (ver realtime_backends)
+Los mensajes de un canal se agrupan durante una ventana (batch_window) y cada lote se serializa
+una sola vez: todas las conexiones reciben el mismo texto ya codificado
+"""
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import cached_property
+import asyncio
+import itertools
+import json
+import uuid
+
+from realtime_backends import InProcessBackend
+
+
+class Batch:
+    """Mensajes de un canal que se envían juntos; se comparte entre todas las conexiones del canal"""
+
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    @cached_property
+    def text(self) -> str:
+        """JSON del lote, calculado una vez: el mensaje solo, o {"type": "batch", "messages": [...]}"""
+        if len(self.messages) == 1:
+            return json.dumps(self.messages[0])
+        return json.dumps({"type": "batch", "messages": self.messages})
+
+
+class Subscription:
+    """Cola de lotes pendientes de enviar a una conexión"""
+
+    def __init__(self, subscription_id: int, channel: str, max_queue: int):
+        self.id = subscription_id
+        self.channel = channel
+        self.queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def send(self, message):
+        """Encolar un mensaje solo para esta conexión (respuestas, snapshots)"""
+        self.push(Batch([message]))
+
+    def push(self, batch: Batch):
+        """Encolar sin esperar. Si la cola está llena se descarta lo pendiente y se marca para cerrar"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        """Próximo lote a enviar, o None si la conexión se quedó atrás y hay que cerrarla"""
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """
+    Suscripciones del proceso y publicación a través del backend (a todos los workers)
+    publish() y publish_local() se llaman desde el event loop
+    batch_window: segundos que se juntan los mensajes de un canal antes de enviarlos (0: en el momento)
+    """
+
+    def __init__(self, max_queue: int, backend=None, batch_window: float = 0):
+        self.max_queue = max_queue
+        self.batch_window = batch_window
+        self._pending = {}  # canal -> [(mensaje, id de suscripción excluida)] de la ventana en curso
+        self.backend = backend or InProcessBackend()
+        self.backend.bind(self._deliver)
+        self.node_id = uuid.uuid4().hex
+        self._channels = defaultdict(set)
+        self._listeners = defaultdict(list)
+        self._subscription_ids = itertools.count(1)
+
+    @contextmanager
+    def subscribe(self, channel: str):
+        subscription = Subscription(next(self._subscription_ids), channel, self.max_queue)
+        self._channels[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def add_listener(self, channel: str, listener):
+        """
+        listener(seq, message) se llama en cada proceso con cada mensaje del canal antes de repartirlo
+        Retorna el mensaje a enviar a los suscriptores (None para no enviarlo)
+        """
+        self._listeners[channel].append(listener)
+
+    def publish(self, channel: str, message, exclude: Subscription = None):
+        """Enviar un mensaje (serializable a JSON) a los suscriptores del canal en todos los procesos (menos exclude)"""
+        origin = [self.node_id, exclude.id] if exclude is not None else None
+        self.backend.publish(channel, message, origin)
+
+    def publish_local(self, channel: str, message):
+        """Enviar un mensaje solo a los suscriptores de este proceso"""
+        self._enqueue(channel, message)
+
+    def _deliver(self, batch: list):
+        for seq, channel, message, origin in batch:
+            for listener in self._listeners.get(channel, ()):
+                message = listener(seq, message)
+                if message is None:
+                    break
+            if message is None:
+                continue
+
+            excluded = origin[1] if origin and origin[0] == self.node_id else None
+            self._enqueue(channel, message, excluded)
+
+    def _enqueue(self, channel: str, message, excluded: int = None):
+        if channel not in self._channels:
+            return
+        pending = self._pending.get(channel)
+        if pending is None:
+            # Primer mensaje de la ventana: se envía todo junto al cerrarla (a lo sumo un lote por ventana)
+            pending = self._pending[channel] = []
+            loop = asyncio.get_running_loop()
+            if self.batch_window > 0:
+                loop.call_later(self.batch_window, self._flush, channel)
+            else:
+                loop.call_soon(self._flush, channel)
+        pending.append((message, excluded))
+
+    def _flush(self, channel: str):
+        pending = self._pending.pop(channel, None)
+        subscriptions = self._channels.get(channel)
+        if not pending or not subscriptions:
+            return
+
+        shared = Batch([message for message, _ in pending])
+        excluded = {subscription_id for _, subscription_id in pending if subscription_id is not None}
+        for subscription in list(subscriptions):
+            if subscription.id not in excluded:
+                subscription.push(shared)
+                continue
+            # Quien envió un mensaje no lo recibe de vuelta: lote propio sin sus mensajes
+            own = [message for message, subscription_id in pending if subscription_id != subscription.id]
+            if own:
+                subscription.push(Batch(own))
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._channels.get(channel, ()))
+
+
+class ChangeEvent:
+    """Inserción numerada con su frame SSE ya codificado (se arma una vez para todas las conexiones)"""
+
+    __slots__ = ("id", "seq", "table", "data", "frame")
+
+    def __init__(self, event_id: str, seq: int, table: str, data: dict):
+        self.id = event_id
+        self.seq = seq
+        self.table = table
+        self.data = data
+        self.frame = f"id: {event_id}\nevent: {table}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class ChangeFeed:
+    """
+    Inserciones (users, images, leaderboard) numeradas para /events (SSE)
+    Cada proceso guarda los últimos eventos en un buffer para reanudar desde Last-Event-ID sin recargar todo
+    Los ids son "<epoch del backend>-<seq>": iguales en todos los workers, y un Last-Event-ID
+    de otro arranque (backend en memoria u outbox nuevo) se detecta
+    """
+
+    CHANNEL = "changes"
+
+    def __init__(self, broadcaster: Broadcaster, buffer_size: int):
+        self.broadcaster = broadcaster
+        self.epoch = broadcaster.backend.epoch
+        self.position = broadcaster.backend.start_seq  # seq del último evento recibido
+        self._complete_after = self.position  # el buffer tiene todos los eventos posteriores a este seq
+        self._buffer = deque(maxlen=max(1, buffer_size))
+        broadcaster.add_listener(self.CHANNEL, self._record)
+
+    def publish(self, table: str, row: dict):
+        """Publicar una inserción en todos los procesos"""
+        self.broadcaster.publish(self.CHANNEL, {"table": table, "data": row})
+
+    def _record(self, seq: int, message: dict) -> ChangeEvent:
+        event = ChangeEvent(f"{self.epoch}-{seq}", seq, message["table"], message["data"])
+        if len(self._buffer) == self._buffer.maxlen:
+            self._complete_after = self._buffer[0].seq
+        self._buffer.append(event)
+        self.position = seq
+        return event
+
+    @property
+    def last_event_id(self) -> str:
+        """Id del último evento recibido (posición actual para un cliente nuevo)"""
+        return f"{self.epoch}-{self.position}"
+
+    def event_seq(self, event_id: str):
+        """seq de un id de evento de este epoch, o None"""
+        epoch, _, seq = event_id.partition("-")
+        return int(seq) if epoch == self.epoch and seq.isdigit() else None
+
+    def replay(self, last_event_id: str):
+        """
+        Eventos posteriores a last_event_id que siguen en el buffer
+        Retorna None si no se puede reanudar (otro epoch, id inválido o eventos ya descartados)
+        Si el id es más nuevo que lo recibido (viene de otro worker más adelantado) retorna []
+        """
+        seq = self.event_seq(last_event_id)
+        if seq is None or seq < self._complete_after:
+            return None
+        return [event for event in self._buffer if event.seq > seq]
+
+
+def _ranking_key(entry: dict) -> tuple:
+    # Mismo orden que get_leaderboard: score, date, id descendentes
+    return (entry["score"], entry["date"], entry["id"])
+
+
+def ranking_patch(old: list, new: list) -> dict:
+    """
+    Diferencia entre dos tops (listas de entradas con "id", en orden; los ranks empiezan en 1)
+    - removed: [{"id", "rank"}] las que salieron (rank anterior)
+    - moved: [{"id", "from", "to"}] las que cambiaron de orden relativo respecto de las demás
+    - inserted: [{"rank", "entry"}] las nuevas
+    Para aplicarlo: quitar removed y moved, y luego insertar moved e inserted por rank ascendente
+    Los corrimientos por entradas que entran o salen no se envían como moved
+    """
+    old_ranks = {entry["id"]: rank for rank, entry in enumerate(old, 1)}
+    new_ids = {entry["id"] for entry in new}
+
+    # Las que siguen en el top y mantienen su orden relativo (subsecuencia creciente más larga
+    # de sus ranks anteriores) no se mueven; el resto se informa como moved
+    kept = [(rank, entry["id"]) for rank, entry in enumerate(new, 1) if entry["id"] in old_ranks]
+    tails, tail_indexes, previous = [], [], [None] * len(kept)
+    for index, (_, entry_id) in enumerate(kept):
+        position = bisect_left(tails, old_ranks[entry_id])
+        if position == len(tails):
+            tails.append(old_ranks[entry_id])
+            tail_indexes.append(index)
+        else:
+            tails[position] = old_ranks[entry_id]
+            tail_indexes[position] = index
+        previous[index] = tail_indexes[position - 1] if position else None
+    stable = set()
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        stable.add(kept[index][1])
+        index = previous[index]
+
+    return {
+        "removed": [
+            {"id": entry["id"], "rank": rank}
+            for rank, entry in enumerate(old, 1) if entry["id"] not in new_ids
+        ],
+        "moved": [
+            {"id": entry_id, "from": old_ranks[entry_id], "to": rank}
+            for rank, entry_id in kept if entry_id not in stable
+        ],
+        "inserted": [
+            {"rank": rank, "entry": entry}
+            for rank, entry in enumerate(new, 1) if entry["id"] not in old_ranks
+        ],
+    }
+
+
+class LeaderboardFeeds:
+    """
+    Top N en vivo por juego (/ws/cocteles/{game})
+    Guarda el último top enviado de cada juego con suscriptores; después de cada envío a /cocteles
+    publica solo la diferencia como un patch con número de secuencia (seq). Los clientes que ven
+    un salto en seq piden un snapshot nuevo
+    El aviso de cambio (notify) llega a todos los workers por el backend; cada uno recalcula y envía
+    los patches a sus propias conexiones (el seq es por proceso: al reconectarse llega un snapshot)
+    """
+
+    REFRESH_CHANNEL = "leaderboard:refresh"
+
+    def __init__(self, broadcaster: Broadcaster, load_top, top_n: int):
+        self.broadcaster = broadcaster
+        self.load_top = load_top  # async (game, limit) -> entradas del top en orden
+        self.top_n = top_n
+        self._tops = {}  # game -> [seq, entradas]
+        self._locks = defaultdict(asyncio.Lock)
+        self._pending = {}  # game -> claves nuevas a revisar (None: recalcular sin atajo)
+        self._tasks = set()
+        broadcaster.add_listener(self.REFRESH_CHANNEL, self._on_refresh)
+
+    def notify(self, game: str = None, inserted: list = None):
+        """
+        Avisar a todos los workers que cambió el leaderboard de game (None: todos los juegos)
+        inserted: claves (score, date, id) de las entradas nuevas
+        """
+        self.broadcaster.publish(self.REFRESH_CHANNEL, {"game": game, "inserted": inserted})
+
+    def _on_refresh(self, seq: int, message: dict):
+        inserted = [tuple(key) for key in message["inserted"]] if message["inserted"] else None
+        games = [message["game"]] if message["game"] is not None else list(self._tops)
+        for game in games:
+            if game not in self._tops:
+                continue  # nadie lo sigue en este proceso
+            if game in self._pending:
+                # Ya hay un recálculo esperando: se suman las claves (varios avisos, una consulta)
+                pending = self._pending[game]
+                self._pending[game] = pending + inserted if pending and inserted else None
+                continue
+            self._pending[game] = inserted
+            task = asyncio.get_running_loop().create_task(self._run_refresh(game))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return None
+
+    async def _run_refresh(self, game: str):
+        inserted = self._pending.pop(game)
+        try:
+            await self.refresh(game, inserted)
+        except Exception as e:
+            print(f"Error refreshing live leaderboard for {game}: {e}")
+
+    @staticmethod
+    def channel(game: str) -> str:
+        return f"cocteles:{game}"
+
+    async def send_snapshot(self, game: str, subscription: Subscription):
+        """Encolar el top actual en una suscripción (al conectarse o al pedir resync)"""
+        async with self._locks[game]:
+            state = self._tops.get(game)
+            if state is None:
+                state = self._tops[game] = [0, await self.load_top(game, self.top_n)]
+            subscription.send({
+                "type": "snapshot",
+                "game": game,
+                "seq": state[0],
+                "limit": self.top_n,
+                "entries": state[1],
+            })
+
+    async def refresh(self, game: str, inserted: list = None):
+        """
+        Recalcular el top de un juego y publicar el patch si cambió
+        inserted: claves (score, date, id) de las entradas nuevas; si ninguna entra en el top no se consulta la base
+        """
+        async with self._locks[game]:
+            state = self._tops.get(game)
+            if state is None:
+                return
+            if not self.broadcaster.subscriber_count(self.channel(game)):
+                # Sin suscriptores no se mantiene el top: se vuelve a cargar con el próximo snapshot
+                del self._tops[game]
+                return
+
+            seq, top = state
+            if inserted and len(top) >= self.top_n and all(key < _ranking_key(top[-1]) for key in inserted):
+                return
+
+            new_top = await self.load_top(game, self.top_n)
+            patch = ranking_patch(top, new_top)
+            if not any(patch.values()):
+                return
+
+            state[0], state[1] = seq + 1, new_top
+            self.broadcaster.publish_local(
+                self.channel(game), {"type": "patch", "game": game, "seq": seq + 1, **patch}
+            )
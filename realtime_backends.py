@@ -0,0 +1,245 @@
+"""
+Backends de difusión para las notificaciones en tiempo real
+Con varios workers de uvicorn cada proceso tiene sus propias conexiones: el backend lleva cada mensaje
+publicado a todos los procesos y cada uno lo reparte entre sus suscriptores
+- "inprocess": un solo worker, entrega inmediata
+- "sqlite": outbox en un archivo SQLite compartido; cada proceso detecta las escrituras con
+  PRAGMA data_version y lee las filas nuevas. No necesita otro servicio; la latencia es el intervalo de sondeo
+Los backends entregan lotes [(seq, channel, message, origin)] a la función deliver, en el mismo orden en
+todos los procesos. seq es creciente (no necesariamente consecutivo dentro de un canal)
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+
+def _new_epoch() -> str:
+    return format(time.time_ns() // 1_000_000, "x")
+
+
+class InProcessBackend:
+    """Un solo proceso: publish() entrega en el momento"""
+
+    def __init__(self):
+        self.epoch = _new_epoch()
+        self.start_seq = 0
+        self._seq = 0
+        self._deliver = None
+
+    def bind(self, deliver):
+        self._deliver = deliver
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, channel: str, message, origin=None):
+        self._seq += 1
+        self._deliver([(self._seq, channel, message, origin)])
+
+
+class SqliteOutboxBackend:
+    """
+    Outbox compartido entre procesos en un archivo SQLite (modo WAL)
+    - Un hilo escritor agrupa lo publicado y lo inserta en una transacción por lote
+    - Un hilo lector consulta PRAGMA data_version cada poll_interval (cambia cuando otra conexión confirma)
+      y solo entonces lee las filas nuevas; las entrega al event loop con call_soon_threadsafe
+    Los mensajes propios también pasan por el outbox, así todos los procesos los ven en el mismo orden
+    Se conservan las últimas keep_rows filas; al arrancar se vuelven a entregar las últimas replay_rows
+    (para llenar los buffers de reanudación, p. ej. el de /events)
+    Si el archivo falla (bloqueado, disco lleno) los hilos registran el error y reintentan con espera creciente;
+    mientras tanto se acumulan hasta max_pending mensajes y los que no entran se descartan
+    """
+
+    # Filas escritas entre cada borrado de las viejas
+    _PRUNE_EVERY = 1000
+    # Espera entre reintentos después de un error (se duplica hasta el máximo)
+    _RETRY_DELAY = 0.1
+    _MAX_RETRY_DELAY = 5.0
+
+    def __init__(
+        self,
+        path: str,
+        poll_interval: float = 0.01,
+        keep_rows: int = 10000,
+        replay_rows: int = 0,
+        max_pending: int = 10000,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.keep_rows = max(keep_rows, replay_rows)
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._dropped = 0
+        self._stopping = threading.Event()
+        self._threads = []
+        self._deliver = None
+        self._loop = None
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS realtime_outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        channel TEXT NOT NULL,
+                        payload TEXT NOT NULL
+                    )
+                """
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS realtime_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                # Compartido por todos los procesos; cambia solo si se borra el archivo
+                conn.execute("INSERT OR IGNORE INTO realtime_meta (key, value) VALUES ('epoch', ?)", (_new_epoch(),))
+            self.epoch = conn.execute("SELECT value FROM realtime_meta WHERE key = 'epoch'").fetchone()[0]
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM realtime_outbox").fetchone()[0]
+        finally:
+            conn.close()
+        self.start_seq = max(0, last_id - replay_rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    def bind(self, deliver):
+        self._deliver = deliver
+
+    def start(self, loop):
+        """Arrancar los hilos; las entregas se hacen en loop"""
+        self._loop = loop
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._write_loop, name="realtime-outbox-writer", daemon=True),
+            threading.Thread(target=self._poll_loop, name="realtime-outbox-poller", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def publish(self, channel: str, message, origin=None):
+        """Encolar para el hilo escritor (no bloquea el event loop). Si la cola está llena se descarta"""
+        try:
+            self._pending.put_nowait((channel, json.dumps({"m": message, "o": origin})))
+        except queue.Full:
+            if self._dropped == 0:
+                print(f"Realtime outbox queue full ({self._pending.maxsize} pending): dropping messages")
+            self._dropped += 1
+
+    def _write_loop(self):
+        conn = None
+        batch = []
+        written = 0
+        delay = self._RETRY_DELAY
+        while True:
+            if not batch:
+                # Al detenerse se termina de escribir lo que ya estaba encolado
+                try:
+                    batch.append(self._pending.get(timeout=0.1))
+                except queue.Empty:
+                    if self._stopping.is_set():
+                        break
+                    continue
+                while True:
+                    try:
+                        batch.append(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+
+            try:
+                if conn is None:
+                    conn = self._connect()
+                with conn:
+                    conn.executemany("INSERT INTO realtime_outbox (channel, payload) VALUES (?, ?)", batch)
+                written += len(batch)
+                batch = []
+                delay = self._RETRY_DELAY
+                if self._dropped:
+                    print(f"Realtime outbox recovered after dropping {self._dropped} messages")
+                    self._dropped = 0
+                if written >= self._PRUNE_EVERY:
+                    written = 0
+                    with conn:
+                        conn.execute(
+                            "DELETE FROM realtime_outbox WHERE id <= (SELECT MAX(id) FROM realtime_outbox) - ?",
+                            (self.keep_rows,),
+                        )
+            except Exception as e:
+                print(f"Error writing realtime outbox ({len(batch)} messages waiting): {e}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                # Se reintenta el mismo lote; al detenerse se descarta
+                if self._stopping.wait(delay):
+                    break
+                delay = min(delay * 2, self._MAX_RETRY_DELAY)
+
+        if conn is not None:
+            conn.close()
+
+    def _poll_loop(self):
+        conn = None
+        last_id = self.start_seq
+        version = None
+        delay = self._RETRY_DELAY
+        while not self._stopping.is_set():
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    version = None
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != version:
+                    rows = conn.execute(
+                        "SELECT id, channel, payload FROM realtime_outbox WHERE id > ? ORDER BY id",
+                        (last_id,),
+                    ).fetchall()
+                    version = current
+                    if rows:
+                        batch = []
+                        for row_id, channel, payload in rows:
+                            payload = json.loads(payload)
+                            batch.append((row_id, channel, payload["m"], payload["o"]))
+                        self._loop.call_soon_threadsafe(self._deliver, batch)
+                        last_id = rows[-1][0]
+                delay = self._RETRY_DELAY
+            except Exception as e:
+                print(f"Error polling realtime outbox (after id {last_id}): {e}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self._MAX_RETRY_DELAY)
+                continue
+            self._stopping.wait(self.poll_interval)
+
+        if conn is not None:
+            conn.close()
+
+
+def create_backend(
+    name: str,
+    outbox_path: str = "realtime.db",
+    poll_interval: float = 0.01,
+    replay_rows: int = 0,
+    max_pending: int = 10000,
+):
+    """Backend según la configuración (REALTIME_BACKEND). Lanza ValueError si no existe"""
+    if name == "inprocess":
+        return InProcessBackend()
+    if name == "sqlite":
+        return SqliteOutboxBackend(
+            outbox_path, poll_interval=poll_interval, replay_rows=replay_rows, max_pending=max_pending
+        )
+    raise ValueError(f"Unknown realtime backend: {name} (expected inprocess or sqlite)")
@@ -0,0 +1,325 @@
+"""
+Test del parser JSON incremental (json_stream) y de la decodificación de base64 por partes (image_upload)
+Compara lo que arma el parser con json.loads partiendo el documento en todos los cortes posibles,
+y verifica que los documentos inválidos o incompletos se rechacen
+
+Uso: python test_json_stream.py   (o: python -m pytest test_json_stream.py)
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import tempfile
+import threading
+
+from image_upload import JsonImageUpload
+from image_workers import BoundedWorkerPool, WorkerPoolBusy
+from json_stream import IncrementalJsonParser, JsonStreamError
+
+
+class CollectAll:
+    """Handler que arma todos los escalares; los strings de sink_paths los recibe por partes"""
+
+    def __init__(self, sink_paths=()):
+        self.sink_paths = set(sink_paths)
+        self.values = {}
+        self.sinks = {}
+
+    def string_sink(self, path):
+        if path not in self.sink_paths:
+            return None
+        sink = self.sinks[path] = Sink()
+        return sink
+
+    def wants_value(self, path):
+        return True
+
+    def value(self, path, value):
+        self.values[path] = value
+
+
+class SkipAll(CollectAll):
+    """Handler que no pide nada: el parser salta todo el documento"""
+
+    def wants_value(self, path):
+        return False
+
+
+class Sink:
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+def flatten(value, path=()):
+    """{ruta: escalar} de un documento ya parseado, con las mismas rutas que usa el parser"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {path: value}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, path + (key,)))
+    return flat
+
+
+def parse(document: bytes, handler, chunks=None):
+    """Alimentar el documento al parser en las partes indicadas (o entero)"""
+    parser = IncrementalJsonParser(handler)
+    for chunk in chunks or [document]:
+        parser.feed(chunk)
+    parser.close()
+    return handler
+
+
+def splits(document: bytes):
+    """Todas las formas de partir el documento en dos, más byte por byte"""
+    for cut in range(len(document) + 1):
+        yield [document[:cut], document[cut:]]
+    yield [document[i:i + 1] for i in range(len(document))]
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(["int", "float", "str", "bool", "null"] + (["list", "dict"] if depth < 4 else []))
+    if kind == "int":
+        return rng.randint(-10**12, 10**12)
+    if kind == "float":
+        return rng.uniform(-1e6, 1e6)
+    if kind == "str":
+        alphabet = 'ab "\\/\n\t\x01é€😀'
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {random_value_key(rng): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+
+
+def random_value_key(rng):
+    return "".join(rng.choice('k"\\é😀') for _ in range(rng.randint(1, 4)))
+
+
+def random_chunks(rng, document: bytes):
+    chunks, i = [], 0
+    while i < len(document):
+        size = rng.randint(1, 7)
+        chunks.append(document[i:i + size])
+        i += size
+    return chunks
+
+
+def assert_rejected(document: bytes, handler_class=CollectAll):
+    for chunks in splits(document):
+        try:
+            parse(document, handler_class(), chunks)
+        except JsonStreamError:
+            continue
+        raise AssertionError(f"Accepted invalid document {document!r} split as {chunks!r}")
+
+
+def test_matches_json_loads_at_every_split():
+    document = json.dumps(
+        {"a": [1, -2.5e3, True, False, None, {}], "b": {"c": "x\"y\\z\né\U0001F600", "": []}, "d": "/"},
+        ensure_ascii=True,
+    ).encode()
+    expected = flatten(json.loads(document))
+    for chunks in splits(document):
+        assert parse(document, CollectAll(), chunks).values == expected, chunks
+
+
+def test_matches_json_loads_on_random_documents():
+    rng = random.Random(20)
+    for _ in range(300):
+        value = random_value(rng)
+        document = json.dumps(value, ensure_ascii=rng.random() < 0.5).encode()
+        handler = parse(document, CollectAll(), random_chunks(rng, document))
+        assert handler.values == flatten(json.loads(document)), document
+        # Saltando todo también tiene que aceptarlo
+        parse(document, SkipAll(), random_chunks(rng, document))
+
+
+def test_sink_receives_decoded_string_at_every_split():
+    text = 'iVBOR\\/w0+\\n\\"\\\\ \\u00e9\\ud83d\\ude00 \\uD83D end'
+    document = b'{"skip": "a\\\\b", "img": "' + text.encode() + b'", "n": 1}'
+    expected = json.loads(document)["img"].encode("utf-8", "surrogatepass")
+    for chunks in splits(document):
+        handler = parse(document, CollectAll(sink_paths=[("img",)]), chunks)
+        sink = handler.sinks[("img",)]
+        assert sink.closed
+        assert bytes(sink.data) == expected, chunks
+        assert handler.values == {("skip",): "a\\b", ("n",): 1}
+
+
+def test_nesting_paths_and_depth_limit():
+    document = b'{"contents": [{"parts": [{"text": "hi"}, {"inlineData": {"data": "QUJD"}}]}]}'
+    handler = parse(document, CollectAll(sink_paths=[("contents", 0, "parts", 1, "inlineData", "data")]))
+    assert bytes(handler.sinks[("contents", 0, "parts", 1, "inlineData", "data")].data) == b"QUJD"
+    assert handler.values == {("contents", 0, "parts", 0, "text"): "hi"}
+
+    parser = IncrementalJsonParser(SkipAll(), max_depth=3)
+    parser.feed(b"[[[1]]]")
+    parser.close()
+    try:
+        IncrementalJsonParser(SkipAll(), max_depth=3).feed(b"[[[[1]]]]")
+    except JsonStreamError:
+        pass
+    else:
+        raise AssertionError("Nesting deeper than max_depth was accepted")
+
+
+def test_truncated_documents_are_rejected():
+    document = b'{"a": [1, "x\\u00e9y", {"b": null}], "c": true}'
+    for cut in range(len(document)):
+        for handler_class in (CollectAll, SkipAll):
+            parser = IncrementalJsonParser(handler_class())
+            try:
+                parser.feed(document[:cut])
+                parser.close()
+            except JsonStreamError:
+                continue
+            raise AssertionError(f"Accepted truncated document {document[:cut]!r}")
+
+
+def test_invalid_documents_are_rejected():
+    invalid = [
+        b'{"a":"\\x"}',
+        b'{"a":"\\u12g4"}',
+        b'{"a":"\\u+123"}',
+        b'{"a":"tab\there"}',
+        b'{"a": 1,}',
+        b'[1 2]',
+        b'{"a" 1}',
+        b'{1: 2}',
+        b'[1]]',
+        b'{"a": tru}',
+        b'{"a": 01x}',
+        b'"a" "b"',
+        b'',
+    ]
+    for document in invalid:
+        assert_rejected(document, CollectAll)
+        assert_rejected(document, SkipAll)
+        try:
+            json.loads(document)
+        except ValueError:
+            continue
+        raise AssertionError(f"json.loads accepts {document!r}: the test case is wrong")
+
+
+def test_value_size_limit():
+    parser = IncrementalJsonParser(CollectAll(), max_value_bytes=8)
+    try:
+        parser.feed(b'{"a": "0123456789"}')
+    except JsonStreamError:
+        pass
+    else:
+        raise AssertionError("Value over max_value_bytes was accepted")
+    # Saltado o en un sink no cuenta para el límite
+    parse(b'{"a": "0123456789"}', SkipAll())
+
+
+def test_base64_upload_decodes_in_chunks():
+    data = os.urandom(200 * 1024 + 7)
+    encoded = base64.b64encode(data).decode()
+    # JSON puede escapar "/" y el base64 puede venir cortado en líneas
+    text = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    document = json.dumps({"image_data_base64": text, "style": "anime"}).replace("/", "\\/").encode()
+
+    async def upload(chunk_size, workers=None):
+        with tempfile.TemporaryDirectory() as staging_dir:
+            handler = JsonImageUpload(
+                staging_dir, len(data), lambda path: path == ("image_data_base64",), [("style",)], workers=workers
+            )
+            parser = IncrementalJsonParser(handler)
+            for i in range(0, len(document), chunk_size):
+                parser.feed(document[i:i + chunk_size])
+                await handler.flush()
+            parser.close()
+            await handler.flush()
+
+            (sink,) = handler.images
+            with open(sink.upload.path, "rb") as file:
+                assert file.read() == data
+            assert sink.upload.size == len(data)
+            assert handler.values == {("style",): "anime"}
+
+    for chunk_size in (1000, 4093, 65536, len(document)):
+        asyncio.run(upload(chunk_size))
+
+    workers = BoundedWorkerPool(max_workers=2, max_queue=0)
+    try:
+        asyncio.run(upload(4093, workers))
+    finally:
+        workers.shutdown()
+
+
+def test_base64_upload_rejects_when_workers_busy():
+    """Con el pool lleno la decodificación no se hace en otro hilo: WorkerPoolBusy (503 en main)"""
+    workers = BoundedWorkerPool(max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def upload():
+        busy = asyncio.create_task(workers.run(release.wait))
+        await asyncio.sleep(0)
+        with tempfile.TemporaryDirectory() as staging_dir:
+            handler = JsonImageUpload(staging_dir, 1024, lambda path: path == ("image",), workers=workers)
+            parser = IncrementalJsonParser(handler)
+            parser.feed(b'{"image": "QUJD"}')
+            parser.close()
+            try:
+                await handler.flush()
+            except WorkerPoolBusy:
+                await handler.discard()
+            else:
+                raise AssertionError("Decoded with the worker pool full")
+            finally:
+                release.set()
+                await busy
+
+    try:
+        asyncio.run(upload())
+    finally:
+        workers.shutdown()
+
+
+def test_base64_upload_rejects_bad_padding():
+    async def upload():
+        with tempfile.TemporaryDirectory() as staging_dir:
+            handler = JsonImageUpload(staging_dir, 1024, lambda path: path == ("image",))
+            parser = IncrementalJsonParser(handler)
+            parser.feed(b'{"image": "QUJDR"}')
+            parser.close()
+            try:
+                await handler.flush()
+            except ValueError:
+                await handler.discard()
+                return
+            raise AssertionError("Invalid base64 was accepted")
+
+    asyncio.run(upload())
+
+
+if __name__ == "__main__":
+    print("🧪 Verificando el parser JSON incremental...")
+    test_matches_json_loads_at_every_split()
+    test_matches_json_loads_on_random_documents()
+    test_sink_receives_decoded_string_at_every_split()
+    test_nesting_paths_and_depth_limit()
+    test_truncated_documents_are_rejected()
+    test_invalid_documents_are_rejected()
+    test_value_size_limit()
+    test_base64_upload_decodes_in_chunks()
+    test_base64_upload_rejects_when_workers_busy()
+    test_base64_upload_rejects_bad_padding()
+    print("✅ El parser coincide con json.loads")
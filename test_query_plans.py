@@ -0,0 +1,187 @@
+"""
+Test de planes de consulta
+Ejecuta las funciones de database_simple sobre una base temporal, captura cada SELECT
+y verifica con EXPLAIN QUERY PLAN que ninguna consulta recorra la tabla completa
+ni ordene los resultados en un B-tree temporal
+
+Uso: python test_query_plans.py   (o: python -m pytest test_query_plans.py)
+"""
+import os
+import tempfile
+
+from config import config
+
+# Usar una base de datos temporal y un único lector para poder trazar sus consultas
+_tmp_dir = tempfile.mkdtemp(prefix="query_plans_")
+config.DATABASE_PATH = os.path.join(_tmp_dir, "test.db")
+config.IMAGE_STORAGE_DIR = os.path.join(_tmp_dir, "image_store")
+config.IMAGE_PACK_DIR = os.path.join(_tmp_dir, "image_packs")
+config.DB_POOL_SIZE = 1
+
+import database_simple  # noqa: E402
+
+
+def capture_queries(action):
+    """Ejecutar action() y retornar los SELECT que se hicieron (con los parámetros ya expandidos)"""
+    statements = []
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith("SELECT"):
+            statements.append(sql)
+
+    with database_simple.read_connection() as reader:
+        reader.set_trace_callback(trace)
+    with database_simple.write_connection() as writer:
+        writer.set_trace_callback(trace)
+
+    try:
+        action()
+    finally:
+        with database_simple.read_connection() as reader:
+            reader.set_trace_callback(None)
+        with database_simple.write_connection() as writer:
+            writer.set_trace_callback(None)
+
+    return statements
+
+
+def explain(sql):
+    with database_simple.read_connection() as conn:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+
+
+def bad_plan_steps(plan):
+    """Pasos del plan que indican un recorrido completo de la tabla o un ordenamiento temporal"""
+    bad = []
+    for step in plan:
+        if "TEMP B-TREE" in step:
+            bad.append(step)
+        elif step.startswith("SCAN") and "INDEX" not in step:
+            bad.append(step)
+    return bad
+
+
+def seed_data():
+    jpeg = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+    for i in range(5):
+        database_simple.insert_image(
+            jpeg + bytes([i]),
+            "image/jpeg",
+            {"style": f"style{i % 2}", "user_id": f"user{i % 3}", "timestamp": 1730282400000 + i},
+        )
+        database_simple.insert_user(f"user{i}", f"user{i}@test.com", "2025-10-30 10:00:00")
+        for game in ("Elixir de Zambo", "Pisco Sour"):
+            database_simple.insert_leaderboard_entry(
+                game=game,
+                position=i + 1,
+                name=f"player{i}",
+                score=100 * i,
+                date=f"2025-10-30T10:0{i}:00",
+                timestamp="2025-10-30T10:00:00",
+            )
+
+
+def hot_paths():
+    """Las consultas que se ejecutan en cada request de listado / detalle"""
+    images_page = database_simple.get_all_images(limit=2)
+    users_page = database_simple.get_all_users(limit=2)
+    leaderboard_page = database_simple.get_leaderboard(limit=2)
+    game_page = database_simple.get_leaderboard(game="Pisco Sour", limit=2)
+
+    database_simple.get_all_images(limit=2, after=images_page["next_after"])
+    database_simple.get_all_users(limit=2, after=users_page["next_after"])
+    database_simple.get_leaderboard(limit=2, after=leaderboard_page["next_after"])
+    database_simple.get_leaderboard(game="Pisco Sour", limit=2, after=game_page["next_after"])
+
+    # Filtros de la galería (usuario, estilo, rango de fechas), también con cursor
+    user_page = database_simple.get_all_images(limit=1, user_id="user1")
+    database_simple.get_all_images(limit=1, user_id="user1", after=user_page["next_after"])
+    database_simple.get_all_images(limit=2, style="style0", created_from="2000-01-01 00:00:00")
+    database_simple.get_all_images(limit=2, user_id="user0", style="style1")
+    database_simple.get_all_images(limit=2, created_from="2000-01-01 00:00:00", created_to="2100-01-01 00:00:00")
+
+    database_simple.get_image(1)
+    database_simple.get_user(1)
+    database_simple.get_database_stats()
+    database_simple.migrate_images_chunk(0, 10)
+    database_simple.compact_images_chunk("2000-01-01 00:00:00")
+    database_simple.get_compaction_status(30)
+
+
+def test_hot_queries_use_indexes():
+    seed_data()
+    statements = capture_queries(hot_paths)
+    assert statements, "No queries were captured"
+
+    failures = []
+    for sql in statements:
+        plan = explain(sql)
+        print(f"🔎 {sql}")
+        for step in plan:
+            print(f"     {step}")
+        bad = bad_plan_steps(plan)
+        if bad:
+            failures.append((sql, bad))
+
+    assert not failures, "Queries without a usable index:\n" + "\n".join(
+        f"{sql}\n    {bad}" for sql, bad in failures
+    )
+
+
+def test_migration_scan_uses_partial_index():
+    """migrate_images_chunk corre en cada arranque: con todo migrado no debe recorrer la tabla por id"""
+    seed_data()
+    statements = [
+        sql for sql in capture_queries(lambda: database_simple.migrate_images_chunk(0, 10))
+        if "sha256 IS NULL" in sql
+    ]
+    assert statements
+    for sql in statements:
+        plan = explain(sql)
+        print(f"🔎 {sql}\n     {plan}")
+        assert any("idx_images_unmigrated" in step for step in plan), plan
+
+
+def test_counters_match_tables():
+    """Los totales de table_stats (mantenidos por triggers) deben coincidir con COUNT(*)"""
+    seed_data()
+    database_simple.clear_table("users")
+    database_simple.insert_user("late", "late@test.com", "2025-10-30 11:00:00")
+    # Un juego sin nombre no puede mezclarse con el total general del leaderboard
+    for i in range(2):
+        database_simple.insert_leaderboard_entry("", i + 1, f"anon{i}", i, "2025-10-30T11:00:00", "2025-10-30T11:00:00")
+
+    check_counters()
+    # Lo mismo después de recalcular los contadores (como al actualizar una base existente)
+    with database_simple.write_connection() as conn:
+        database_simple._rebuild_counters(conn.cursor())
+    check_counters()
+
+
+def check_counters():
+    stats = database_simple.get_database_stats()
+    with database_simple.read_connection() as conn:
+        for table in ("images", "users", "leaderboard"):
+            real = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            print(f"📊 {table}: counter={stats[table + '_count']} real={real}")
+            assert stats[f"{table}_count"] == real
+
+        real_game = conn.execute(
+            "SELECT COUNT(*) FROM leaderboard WHERE game = ?", ("Pisco Sour",)
+        ).fetchone()[0]
+        real_empty_game = conn.execute("SELECT COUNT(*) FROM leaderboard WHERE game = ''").fetchone()[0]
+        empty_game_total, _ = database_simple._get_counter(conn.cursor(), "leaderboard_game", "")
+        real_user = conn.execute("SELECT COUNT(*) FROM images WHERE user_id = ?", ("user1",)).fetchone()[0]
+        real_style = conn.execute("SELECT COUNT(*) FROM images WHERE style = ?", ("style0",)).fetchone()[0]
+    assert database_simple.get_leaderboard(game="Pisco Sour")["total"] == real_game
+    assert empty_game_total == real_empty_game == 2
+    assert database_simple.get_all_images(user_id="user1")["total"] == real_user
+    assert database_simple.get_all_images(style="style0")["total"] == real_style
+
+
+if __name__ == "__main__":
+    print("🧪 Verificando planes de consulta...")
+    test_hot_queries_use_indexes()
+    test_migration_scan_uses_partial_index()
+    test_counters_match_tables()
+    print("✅ Todas las consultas usan índices")
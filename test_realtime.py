@@ -0,0 +1,202 @@
+"""
+Test del top en vivo de /ws/cocteles/{game} (realtime.ranking_patch y LeaderboardFeeds)
+Aplica los patches igual que templates/cocteles_ranking.html y verifica que reconstruyan el top nuevo,
+y que un cliente que pierde un patch lo detecte por el seq y se recupere con un snapshot
+También verifica que el outbox SQLite siga entregando después de un error del archivo
+
+Uso: python test_realtime.py   (o: python -m pytest test_realtime.py)
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+
+from realtime import Broadcaster, LeaderboardFeeds, ranking_patch
+from realtime_backends import SqliteOutboxBackend
+
+
+def apply_ranking_patch(entries: list, patch: dict) -> list:
+    """Lo mismo que applyRankingPatch en cocteles_ranking.html"""
+    by_id = {entry["id"]: entry for entry in entries}
+    gone = {item["id"] for item in patch["removed"]} | {item["id"] for item in patch["moved"]}
+    result = [entry for entry in entries if entry["id"] not in gone]
+    additions = [{"rank": item["to"], "entry": by_id[item["id"]]} for item in patch["moved"]]
+    additions += patch["inserted"]
+    for item in sorted(additions, key=lambda item: item["rank"]):
+        result.insert(item["rank"] - 1, item["entry"])
+    return result
+
+
+class LiveClient:
+    """Lo que hace el onmessage de cocteles_ranking.html con snapshots, patches y lotes"""
+
+    def __init__(self):
+        self.seq = None
+        self.entries = None
+        self.resyncs = 0
+
+    def receive(self, batch):
+        for message in batch.messages:
+            if message["type"] == "snapshot":
+                self.entries, self.seq = message["entries"], message["seq"]
+            elif message["type"] == "patch":
+                if self.seq is None or message["seq"] <= self.seq:
+                    continue
+                if message["seq"] != self.seq + 1:
+                    # Se perdió un patch: el cliente manda {"type": "resync"}
+                    self.seq = None
+                    self.resyncs += 1
+                    continue
+                self.entries = apply_ranking_patch(self.entries, message)
+                self.seq = message["seq"]
+
+
+def entry(entry_id: int, score: int) -> dict:
+    return {"id": entry_id, "name": f"player{entry_id}", "score": score, "date": "2025-10-30", "game": "G"}
+
+
+def test_patch_round_trip_random():
+    rng = random.Random(22)
+    for _ in range(2000):
+        pool = [entry(entry_id, rng.randint(0, 50)) for entry_id in range(rng.randint(0, 15))]
+        old = rng.sample(pool, rng.randint(0, len(pool)))
+        new = rng.sample(pool, rng.randint(0, len(pool)))
+        patch = ranking_patch(old, new)
+        assert apply_ranking_patch(old, patch) == new, (old, new, patch)
+
+        if old == new:
+            assert not any(patch.values())
+
+
+def test_patch_only_moves_what_changed_relative_order():
+    old = [entry(i, 100 - i) for i in range(1, 6)]
+    # Entra una nueva arriba y sale la última: las demás solo se corren, no se informan como moved
+    new = [entry(9, 200)] + old[:-1]
+    patch = ranking_patch(old, new)
+    assert patch["moved"] == []
+    assert patch["removed"] == [{"id": 5, "rank": 5}]
+    assert patch["inserted"] == [{"rank": 1, "entry": new[0]}]
+
+    # Una sube al primer lugar: solo esa se mueve
+    new = [old[3]] + old[:3] + old[4:]
+    patch = ranking_patch(old, new)
+    assert patch["moved"] == [{"id": 4, "from": 4, "to": 1}]
+    assert apply_ranking_patch(old, patch) == new
+
+
+def test_seq_gap_triggers_resync():
+    async def scenario():
+        table = [entry(i, 10 * i) for i in range(1, 6)]
+        loads = []
+
+        async def load_top(game, limit):
+            loads.append(game)
+            return sorted(table, key=lambda item: (item["score"], item["date"], item["id"]), reverse=True)[:limit]
+
+        broadcaster = Broadcaster(16)
+        feeds = LeaderboardFeeds(broadcaster, load_top, top_n=3)
+        client = LiveClient()
+
+        with broadcaster.subscribe(feeds.channel("G")) as subscription:
+            await feeds.send_snapshot("G", subscription)
+            client.receive(await subscription.get())
+            assert client.seq == 0 and [item["id"] for item in client.entries] == [5, 4, 3]
+
+            # Patch normal: se aplica y el top del cliente queda igual al de la base
+            table.append(entry(6, 45))
+            await feeds.refresh("G", [(45, "2025-10-30", 6)])
+            await asyncio.sleep(0)
+            client.receive(await subscription.get())
+            assert client.seq == 1
+            assert client.entries == await load_top("G", 3)
+
+            # Entrada que no entra en el top lleno: no se consulta la base ni se envía nada
+            loads.clear()
+            table.append(entry(7, 1))
+            await feeds.refresh("G", [(1, "2025-10-30", 7)])
+            assert loads == []
+
+            # Se pierde un patch: el siguiente tiene un salto de seq y el cliente pide resync
+            table.append(entry(8, 100))
+            await feeds.refresh("G")
+            await asyncio.sleep(0)
+            await subscription.get()  # perdido
+            table.append(entry(9, 90))
+            await feeds.refresh("G")
+            await asyncio.sleep(0)
+            client.receive(await subscription.get())
+            assert client.seq is None and client.resyncs == 1
+
+            # El snapshot del resync trae el seq actual y los patches siguientes vuelven a aplicarse
+            await feeds.send_snapshot("G", subscription)
+            client.receive(await subscription.get())
+            assert client.seq == 3
+            table.append(entry(10, 95))
+            await feeds.refresh("G")
+            await asyncio.sleep(0)
+            client.receive(await subscription.get())
+            assert client.seq == 4
+            assert client.entries == await load_top("G", 3)
+
+        # Sin suscriptores el top se descarta; se vuelve a cargar con el próximo snapshot
+        await feeds.refresh("G")
+        assert "G" not in feeds._tops
+
+    asyncio.run(scenario())
+
+
+def test_outbox_recovers_from_errors_and_bounds_queue():
+    async def scenario(path):
+        received = []
+        backend = SqliteOutboxBackend(path, poll_interval=0.005, max_pending=5)
+        backend.bind(received.extend)
+
+        async def wait_for(count):
+            for _ in range(400):
+                if len(received) >= count:
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError(f"Expected {count} messages, got {len(received)}")
+
+        backend.start(asyncio.get_running_loop())
+        try:
+            backend.publish("users", {"n": 1})
+            await wait_for(1)
+
+            # Sin la tabla fallan las escrituras y las lecturas: los hilos tienen que seguir vivos
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute("ALTER TABLE realtime_outbox RENAME TO realtime_outbox_old")
+            backend.publish("users", {"n": 2})
+            await asyncio.sleep(0.3)
+            assert all(thread.is_alive() for thread in backend._threads)
+
+            # La cola está acotada: lo que no entra se descarta
+            for n in range(3, 20):
+                backend.publish("users", {"n": n})
+            assert backend._pending.qsize() <= 5 and backend._dropped > 0
+
+            with conn:
+                conn.execute("ALTER TABLE realtime_outbox_old RENAME TO realtime_outbox")
+            conn.close()
+            # El lote que falló (2) se reintenta, más los 5 que entraron en la cola
+            await wait_for(7)
+            await asyncio.sleep(0.1)
+            assert [message["n"] for _, _, message, _ in received] == list(range(1, 8))
+            assert backend._dropped == 0
+        finally:
+            backend.stop()
+        assert backend._threads == []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(scenario(os.path.join(tmp_dir, "realtime.db")))
+
+
+if __name__ == "__main__":
+    print("🧪 Verificando el top en vivo...")
+    test_patch_round_trip_random()
+    test_patch_only_moves_what_changed_relative_order()
+    test_seq_gap_triggers_resync()
+    test_outbox_recovers_from_errors_and_bounds_queue()
+    print("✅ Los patches reconstruyen el top")